@@ -0,0 +1,297 @@
+import math
+import time
+import heapq
+import asyncio
+import fnmatch
+import itertools
+from contextlib import asynccontextmanager
+from starlette.responses import JSONResponse
+from logger.custom_logger import CustomLogger
+
+# Lanes, best first: interactive chat is admitted ahead of analysis/compare,
+# which go ahead of bulk indexing
+LANE_INTERACTIVE = "interactive"
+LANE_DEFAULT = "default"
+LANE_BULK = "bulk"
+
+_DEFAULT_LANES = {
+    LANE_INTERACTIVE: {"priority": 2, "max_concurrency": 16, "max_queue": 64,
+                       "max_wait_seconds": 2.0, "base_tokens": 1500},
+    LANE_DEFAULT: {"priority": 1, "max_concurrency": 8, "max_queue": 32,
+                   "max_wait_seconds": 5.0, "base_tokens": 2000},
+    LANE_BULK: {"priority": 0, "max_concurrency": 4, "max_queue": 16,
+                "max_wait_seconds": 10.0, "base_tokens": 1000},
+}
+
+
+class TokenBucket:
+    """
+    Tokens-per-minute budget that refills continuously.
+    """
+
+    def __init__(self, tokens_per_minute: float):
+        self.capacity = float(tokens_per_minute)
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def take(self, cost: float) -> float:
+        """
+        Take `cost` tokens; returns 0 on success, else seconds until they exist.
+        """
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        cost = min(cost, self.capacity)  # an oversized request must still fit eventually
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0.0
+        return (cost - self.tokens) / self.rate
+
+    def refund(self, cost: float):
+        self.tokens = min(self.capacity, self.tokens + cost)
+
+
+class AdmissionRejected(Exception):
+    """
+    A request refused by admission control, with its HTTP status (429 or
+    503) and a Retry-After estimate in seconds.
+    """
+
+    def __init__(self, status_code: int, detail: str, retry_after: int):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+        self.headers = {"Retry-After": str(retry_after)}
+
+
+class _Waiter:
+    __slots__ = ("lane", "tenant_id", "granted", "event")
+
+    def __init__(self, lane: str, tenant_id: str):
+        self.lane = lane
+        self.tenant_id = tenant_id
+        self.granted = False
+        self.event = None
+
+
+class AdmissionController:
+    """
+    Admission control in front of the API's expensive endpoints.
+    A request is rejected with 429 when its tenant is over its concurrency,
+    token-per-minute or pending-job quota, and with 503 when its lane's
+    bounded queue is full or it could not start before the lane's deadline.
+    Freed slots go to the highest-priority lane first. Rejections carry a
+    Retry-After estimate so clients back off instead of timing out.
+    Queued requests wait on the event loop, not in worker threads, so a
+    full queue never starves the threadpool that runs admitted endpoints.
+    All state is owned by the event loop thread.
+    """
+
+    def __init__(self, config: dict, pending_jobs=None):
+        self.log = CustomLogger().get_logger(__name__)
+        admission = config.get("admission", {})
+        self.max_concurrency = int(admission.get("max_concurrency", 16))
+        self.tenant_max_concurrency = int(admission.get("tenant_max_concurrency", 4))
+        self.tenant_tokens_per_minute = float(admission.get("tenant_tokens_per_minute", 200000))
+        self.bytes_per_token = float(admission.get("bytes_per_token", 16))
+        self.max_pending_jobs_per_tenant = int(admission.get("max_pending_jobs_per_tenant", 20))
+        self.lanes = {name: {**defaults, **admission.get("lanes", {}).get(name, {})}
+                      for name, defaults in _DEFAULT_LANES.items()}
+        # Callable tenant_id -> queued/running background jobs
+        self.pending_jobs = pending_jobs
+
+        self._seq = itertools.count()
+        self._waiting = []  # heap of (-priority, seq, waiter)
+        self._queued = {lane: 0 for lane in self.lanes}
+        self._running = {lane: 0 for lane in self.lanes}
+        self._tenant_active = {}
+        self._buckets = {}
+        # Smoothed service time per lane, for wait and Retry-After estimates
+        self._service_seconds = {lane: 1.0 for lane in self.lanes}
+
+    @asynccontextmanager
+    async def admit(self, tenant_id: str, lane: str, content_length: int = 0,
+                    creates_job: bool = False):
+        """
+        Hold an admission slot for the duration of the block, or raise
+        AdmissionRejected(429/503) straight away or once the deadline passes.
+        """
+        config = self.lanes[lane]
+        cost = config["base_tokens"] + (content_length or 0) / self.bytes_per_token
+        waiter = await self._enter(tenant_id, lane, cost, creates_job)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self._leave(waiter, time.monotonic() - started)
+
+    async def _enter(self, tenant_id: str, lane: str, cost: float,
+                     creates_job: bool) -> _Waiter:
+        config = self.lanes[lane]
+        if creates_job and self.pending_jobs is not None:
+            # A SQLite count; kept off the event loop
+            pending = await asyncio.to_thread(self.pending_jobs, tenant_id)
+            if pending >= self.max_pending_jobs_per_tenant:
+                self._reject(429, "Too many pending jobs for tenant", tenant_id, lane,
+                             self._service_seconds[lane])
+
+        if self._tenant_active.get(tenant_id, 0) >= self.tenant_max_concurrency:
+            self._reject(429, "Tenant concurrency limit reached", tenant_id, lane,
+                         self._service_seconds[lane])
+        bucket = self._buckets.setdefault(
+            tenant_id, TokenBucket(self.tenant_tokens_per_minute))
+        wait = bucket.take(cost)
+        if wait:
+            self._reject(429, "Tenant token quota exceeded", tenant_id, lane, wait)
+
+        waiter = _Waiter(lane, tenant_id)
+        self._tenant_active[tenant_id] = self._tenant_active.get(tenant_id, 0) + 1
+        if self._can_start(lane):
+            self._start(waiter)
+            return waiter
+
+        estimated_wait = self._estimated_wait(lane)
+        if self._queued[lane] >= config["max_queue"] or \
+                estimated_wait > config["max_wait_seconds"]:
+            self._abandon(waiter, bucket, cost)
+            self._reject(503, "Server busy", tenant_id, lane, estimated_wait)
+
+        self._queued[lane] += 1
+        waiter.event = asyncio.Event()
+        heapq.heappush(self._waiting, (-config["priority"], next(self._seq), waiter))
+        try:
+            await asyncio.wait_for(waiter.event.wait(), config["max_wait_seconds"])
+        except asyncio.TimeoutError:
+            pass
+        except BaseException:
+            # Client went away while queued: give back whatever it holds
+            if waiter.granted:
+                self._leave(waiter, 0.0, record=False)
+            else:
+                self._dequeue(waiter)
+                self._abandon(waiter, bucket, cost)
+            raise
+
+        if not waiter.granted:
+            self._dequeue(waiter)
+            self._abandon(waiter, bucket, cost)
+            self._reject(503, "Server busy", tenant_id, lane, self._estimated_wait(lane))
+        return waiter
+
+    def _dequeue(self, waiter: _Waiter):
+        self._queued[waiter.lane] -= 1
+        self._waiting = [entry for entry in self._waiting if entry[2] is not waiter]
+        heapq.heapify(self._waiting)
+
+    def _leave(self, waiter: _Waiter, elapsed: float, record: bool = True):
+        lane = waiter.lane
+        self._running[lane] -= 1
+        self._release_tenant(waiter.tenant_id)
+        if record:
+            self._service_seconds[lane] = 0.8 * self._service_seconds[lane] + 0.2 * elapsed
+        self._dispatch()
+
+    def _dispatch(self):
+        """
+        Grant free slots to waiters, best lane first, skipping lanes at capacity.
+        """
+        skipped = []
+        while self._waiting and sum(self._running.values()) < self.max_concurrency:
+            entry = heapq.heappop(self._waiting)
+            waiter = entry[2]
+            if self._running[waiter.lane] >= self.lanes[waiter.lane]["max_concurrency"]:
+                skipped.append(entry)
+                continue
+            self._queued[waiter.lane] -= 1
+            self._start(waiter)
+            waiter.event.set()
+        for entry in skipped:
+            heapq.heappush(self._waiting, entry)
+
+    def _can_start(self, lane: str) -> bool:
+        if sum(self._running.values()) >= self.max_concurrency:
+            return False
+        if self._running[lane] >= self.lanes[lane]["max_concurrency"]:
+            return False
+        # Do not overtake anyone already waiting in this lane or a better one
+        priority = self.lanes[lane]["priority"]
+        return not any(-entry[0] >= priority for entry in self._waiting)
+
+    def _start(self, waiter: _Waiter):
+        waiter.granted = True
+        self._running[waiter.lane] += 1
+
+    def _estimated_wait(self, lane: str) -> float:
+        priority = self.lanes[lane]["priority"]
+        ahead = sum(1 for entry in self._waiting if -entry[0] >= priority) + 1
+        slots = min(self.max_concurrency, self.lanes[lane]["max_concurrency"])
+        return ahead * self._service_seconds[lane] / slots
+
+    def _abandon(self, waiter: _Waiter, bucket: TokenBucket, cost: float):
+        bucket.refund(cost)
+        self._release_tenant(waiter.tenant_id)
+
+    def _release_tenant(self, tenant_id: str):
+        active = self._tenant_active.get(tenant_id, 0) - 1
+        if active > 0:
+            self._tenant_active[tenant_id] = active
+        else:
+            self._tenant_active.pop(tenant_id, None)
+
+    def _reject(self, status_code: int, detail: str, tenant_id: str, lane: str,
+                retry_after: float):
+        retry_after = max(1, math.ceil(retry_after))
+        self.log.warning("Request rejected by admission control", status_code=status_code,
+                         detail=detail, tenant_id=tenant_id, lane=lane,
+                         retry_after=retry_after)
+        raise AdmissionRejected(status_code, detail, retry_after)
+
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware that admits requests by route before anything reads
+    their body: FastAPI parses form and file bodies before dependencies
+    run, so a request refused there would already have been uploaded.
+    `routes` maps (method, path pattern) to (lane, creates_job); patterns
+    use fnmatch syntax, e.g. "/chat/sessions/*/snapshot". The slot is held
+    until the response has been sent.
+    """
+
+    def __init__(self, app, controller: AdmissionController, routes: dict):
+        self.app = app
+        self.controller = controller
+        self.routes = routes
+
+    async def __call__(self, scope, receive, send):
+        rule = self._match(scope) if scope["type"] == "http" else None
+        if rule is None:
+            await self.app(scope, receive, send)
+            return
+
+        lane, creates_job = rule
+        headers = dict(scope.get("headers") or [])
+        tenant_id = headers.get(b"x-tenant-id", b"default").decode("latin-1") or "default"
+        try:
+            content_length = int(headers.get(b"content-length", b"0"))
+        except ValueError:
+            content_length = 0
+
+        admitted = False
+        try:
+            async with self.controller.admit(tenant_id, lane, content_length, creates_job):
+                admitted = True
+                await self.app(scope, receive, send)
+        except AdmissionRejected as e:
+            if admitted:
+                raise
+            response = JSONResponse({"detail": e.detail}, status_code=e.status_code,
+                                    headers=e.headers)
+            await response(scope, receive, send)
+
+    def _match(self, scope):
+        for (method, pattern), rule in self.routes.items():
+            if scope["method"] == method and fnmatch.fnmatchcase(scope["path"], pattern):
+                return rule
+        return None
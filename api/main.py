@@ -0,0 +1,231 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import List, Optional
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, UploadFile, File, Form, Header, HTTPException, Request
+from fastapi.responses import HTMLResponse
+from fastapi.staticfiles import StaticFiles
+from fastapi.templating import Jinja2Templates
+from logger.custom_logger import CustomLogger
+from logger.tracing import start_trace, valid_request_id
+from exception.custom_exception_archive import DocumentPortalException
+from utils.config_loader import load_config
+from utils.path_utils import is_safe_id
+from api.admission import (
+    AdmissionController, AdmissionMiddleware, LANE_INTERACTIVE, LANE_DEFAULT, LANE_BULK)
+from api.request_limits import RequestSizeLimit
+from src.document_ingestion.data_ingestion import DocumentHandler
+from src.job_queue.job_queue import JobQueue, PRIORITY_DEFAULT, PRIORITY_BULK
+from src.document_chat.retrieval import ConversationalRAG
+from src.document_ingestion.session_snapshot import SessionSnapshotter
+
+log = CustomLogger().get_logger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(os.getcwd(), "data")
+
+config = load_config()
+job_queue = JobQueue()
+admission = AdmissionController(config, pending_jobs=job_queue.pending)
+
+# (method, path pattern) -> (admission lane, whether the request queues a job)
+ADMISSION_ROUTES = {
+    ("POST", "/analyze"): (LANE_DEFAULT, True),
+    ("POST", "/compare"): (LANE_DEFAULT, True),
+    ("POST", "/chat/index"): (LANE_BULK, True),
+    ("POST", "/chat/sessions/*/snapshot"): (LANE_BULK, False),
+    ("POST", "/chat/query"): (LANE_INTERACTIVE, False),
+}
+
+# Recently used chat sessions, so each query does not reload models and history
+MAX_CACHED_SESSIONS = 64
+rag_sessions = OrderedDict()
+rag_sessions_lock = threading.Lock()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    job_queue.start()
+    yield
+    job_queue.stop()
+
+
+app = FastAPI(title="Document Portal API", lifespan=lifespan)
+app.mount("/static", StaticFiles(directory=os.path.join(BASE_DIR, "static")), name="static")
+templates = Jinja2Templates(directory=os.path.join(BASE_DIR, "templates"))
+# Admission runs before any body is read; queued requests wait on the event loop
+app.add_middleware(AdmissionMiddleware, controller=admission, routes=ADMISSION_ROUTES)
+# Refuses oversized bodies before anything reads or spools them
+app.add_middleware(
+    RequestSizeLimit,
+    max_body_bytes=int(config.get("ingestion", {}).get("max_request_size_mb", 110)) * 1024 * 1024)
+
+
+def save_upload(handler: DocumentHandler, upload: UploadFile, allowed_extensions=None):
+    """
+    Save an upload, turning rejected files into a 400 instead of a 500.
+    """
+    try:
+        return handler.save_file(upload, allowed_extensions=allowed_extensions)
+    except DocumentPortalException as e:
+        raise HTTPException(status_code=400, detail=str(e.__cause__ or e.error_message))
+
+
+def require_id(value: str, field: str) -> str:
+    """
+    Refuse tenant and session ids that could not be used as a directory name.
+    """
+    if not is_safe_id(value):
+        raise HTTPException(status_code=400,
+                            detail=f"Invalid {field}: use 1-64 letters, digits, '_' or '-'")
+    return value
+
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """
+    Trace every request under its X-Request-ID (generated when absent or
+    not a plain id); `X-Profile: 1` also records sampled stacks for that
+    request and the jobs it queues.
+    """
+    request_id = valid_request_id(request.headers.get("x-request-id"))
+    profile = request.headers.get("x-profile", "").lower() in ("1", "true", "yes")
+    with start_trace(f"{request.method} {request.url.path}", request_id=request_id,
+                     profile=profile, tenant_id=request.headers.get("x-tenant-id", "default")) as trace:
+        response = await call_next(request)
+        if trace is not None:
+            trace.attributes["status_code"] = response.status_code
+            if response.status_code >= 500:
+                trace.error = f"HTTP {response.status_code}"
+    response.headers["X-Request-ID"] = request_id
+    return response
+
+
+@app.get("/", response_class=HTMLResponse)
+async def serve_ui(request: Request):
+    return templates.TemplateResponse("index.html", {"request": request})
+
+
+@app.get("/health")
+def health():
+    return {"status": "ok"}
+
+
+@app.post("/analyze")
+def analyze_document(file: UploadFile = File(...),
+                     x_tenant_id: str = Header("default")):
+    """
+    Save the upload and queue its analysis. Poll /jobs/{job_id} for the result.
+    """
+    require_id(x_tenant_id, "X-Tenant-ID")
+    handler = DocumentHandler(data_dir=os.path.join(DATA_DIR, "document_analysis"))
+    saved = save_upload(handler, file)
+    return job_queue.submit(
+        "analyze", {"file_path": saved.file_path},
+        tenant_id=x_tenant_id, priority=PRIORITY_DEFAULT,
+        dedup_key=saved.content_hash)
+
+
+@app.post("/compare")
+def compare_documents(reference: UploadFile = File(...),
+                      actual: UploadFile = File(...),
+                      x_tenant_id: str = Header("default")):
+    """
+    Save both PDFs and queue their comparison.
+    """
+    require_id(x_tenant_id, "X-Tenant-ID")
+    data_dir = os.path.join(DATA_DIR, "document_compare")
+    handler = DocumentHandler(data_dir=data_dir)
+    ref = save_upload(handler, reference, allowed_extensions={".pdf"})
+    act = save_upload(handler, actual, allowed_extensions={".pdf"})
+    return job_queue.submit(
+        "compare",
+        {"data_dir": data_dir, "session_id": handler.session_id,
+         "reference_path": ref.file_path, "actual_path": act.file_path},
+        tenant_id=x_tenant_id, priority=PRIORITY_DEFAULT,
+        dedup_key=[ref.content_hash, act.content_hash])
+
+
+@app.post("/chat/index")
+def build_chat_index(files: List[UploadFile] = File(...),
+                     session_id: Optional[str] = Form(None),
+                     x_tenant_id: str = Header("default")):
+    """
+    Save the uploads into a chat session and queue the index build.
+    With an existing session_id the files are added to that session and its
+    index is rebuilt over all of them.
+    """
+    require_id(x_tenant_id, "X-Tenant-ID")
+    if session_id:
+        require_id(session_id, "session_id")
+    data_dir = os.path.join(DATA_DIR, "multi_document_chat")
+    handler = DocumentHandler(data_dir=data_dir, session_id=session_id or None)
+    saved = [save_upload(handler, f) for f in files]
+    submitted = job_queue.submit(
+        "index",
+        {"tenant_id": x_tenant_id, "session_id": handler.session_id,
+         "data_dir": data_dir, "file_paths": [s.file_path for s in saved],
+         "content_hashes": {s.file_name: s.content_hash for s in saved}},
+        tenant_id=x_tenant_id, priority=PRIORITY_BULK,
+        dedup_key=[handler.session_id] + sorted(s.content_hash for s in saved))
+    return {**submitted, "session_id": handler.session_id}
+
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str, x_tenant_id: str = Header("default")):
+    job = job_queue.get(job_id)
+    # Other tenants' jobs are reported as missing, not as forbidden
+    if job is None or job["tenant_id"] != x_tenant_id:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {key: job[key] for key in
+            ("id", "kind", "status", "progress", "message", "result", "error",
+             "attempts", "created_at", "updated_at")}
+
+
+@app.post("/chat/sessions/{session_id}/snapshot")
+def snapshot_chat_session(session_id: str, x_tenant_id: str = Header("default")):
+    """
+    Publish the session's current state (index and chat history) as a
+    snapshot, so any worker can serve it. This is the only way history is
+    published; the republish after each index build carries the index only.
+    """
+    require_id(x_tenant_id, "X-Tenant-ID")
+    require_id(session_id, "session_id")
+    try:
+        key = SessionSnapshotter().export_to_store(x_tenant_id, session_id,
+                                                   include_history=True)
+    except DocumentPortalException as e:
+        raise HTTPException(status_code=404, detail=str(e.__cause__ or e.error_message))
+    return {"session_id": session_id, "snapshot_key": key}
+
+
+@app.post("/chat/query")
+def chat_query(question: str = Form(...),
+               session_id: str = Form(...),
+               x_tenant_id: str = Header("default")):
+    require_id(x_tenant_id, "X-Tenant-ID")
+    require_id(session_id, "session_id")
+    return {"answer": chat_session(x_tenant_id, session_id).invoke(question),
+            "session_id": session_id}
+
+
+def chat_session(tenant_id: str, session_id: str) -> ConversationalRAG:
+    """
+    The cached ConversationalRAG of a session. Concurrent queries share one
+    instance, which answers them in turn.
+    """
+    key = (tenant_id, session_id)
+    with rag_sessions_lock:
+        rag = rag_sessions.get(key)
+        if rag is not None:
+            rag_sessions.move_to_end(key)
+            return rag
+    # Loading models and history is slow; a concurrent loser is discarded
+    rag = ConversationalRAG(session_id=session_id, tenant_id=tenant_id)
+    with rag_sessions_lock:
+        rag = rag_sessions.setdefault(key, rag)
+        rag_sessions.move_to_end(key)
+        while len(rag_sessions) > MAX_CACHED_SESSIONS:
+            rag_sessions.popitem(last=False)
+    return rag
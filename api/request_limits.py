@@ -0,0 +1,69 @@
+from fastapi import HTTPException
+from starlette.responses import JSONResponse
+from logger.custom_logger import CustomLogger
+
+
+class RequestSizeLimit:
+    """
+    ASGI middleware that caps request bodies before anything parses them.
+    Starlette spools a whole multipart body to disk before an endpoint
+    runs, so per-file limits in DocumentHandler come too late to protect
+    the server. Requests declaring a larger Content-Length get 413 without
+    their body being read; chunked or understated bodies are counted as
+    they stream in and cut off at the limit.
+    """
+
+    def __init__(self, app, max_body_bytes: int):
+        self.app = app
+        self.max_body_bytes = max_body_bytes
+        self.log = CustomLogger().get_logger(__name__)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        try:
+            declared = int(headers.get(b"content-length", b"0"))
+        except ValueError:
+            declared = 0
+        if declared > self.max_body_bytes:
+            self.log.warning("Request body too large", path=scope.get("path"),
+                             content_length=declared, limit=self.max_body_bytes)
+            await self._too_large(scope, receive, send)
+            return
+
+        received = 0
+        response_started = False
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body_bytes:
+                    # FastAPI re-raises HTTPException from body parsing as-is
+                    raise HTTPException(status_code=413, detail="Request body too large")
+            return message
+
+        async def tracking_send(message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracking_send)
+        except HTTPException as e:
+            if e.status_code != 413 or response_started:
+                raise
+            self.log.warning("Request body too large", path=scope.get("path"),
+                             received=received, limit=self.max_body_bytes)
+            await self._too_large(scope, receive, send)
+
+    async def _too_large(self, scope, receive, send):
+        response = JSONResponse(
+            {"detail": f"Request body too large (limit {self.max_body_bytes} bytes)"},
+            status_code=413, headers={"Connection": "close"})
+        await response(scope, receive, send)
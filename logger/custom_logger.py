@@ -186,6 +186,8 @@ class CustomLogger:
         # Configure structlog for JSON structured logging
         structlog.configure(
             processors=[
+                # Request id and other values bound per request (see logger.tracing)
+                structlog.contextvars.merge_contextvars,
                 structlog.processors.TimeStamper(
                     fmt="iso", utc=True, key="timestamp"),
                 structlog.processors.add_log_level,
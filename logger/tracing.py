@@ -0,0 +1,290 @@
+import os
+import re
+import sys
+import json
+import time
+import uuid
+import random
+import threading
+import functools
+import contextvars
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timezone
+import structlog
+from logger.custom_logger import CustomLogger
+
+log = CustomLogger().get_logger(__name__)
+
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+_current_span = contextvars.ContextVar("current_span", default=None)
+# Request ids name exported trace files and are echoed to clients
+_REQUEST_ID = re.compile(r"[A-Za-z0-9._-]{1,64}")
+
+_DEFAULT_SETTINGS = {
+    "enabled": True,
+    "export_dir": "traces",
+    "sample_rate": 0.05,
+    "slow_ms": 2000,
+    "allow_profiling": False,
+    "profile_interval_ms": 5,
+}
+_settings = None
+
+
+def tracing_settings() -> dict:
+    """
+    The `tracing` block of config.yaml over defaults, loaded once.
+    """
+    global _settings
+    if _settings is None:
+        try:
+            from utils.config_loader import load_config
+            configured = load_config().get("tracing", {})
+        except Exception as e:
+            log.warning("Tracing config unavailable, using defaults", error=str(e))
+            configured = {}
+        _settings = {**_DEFAULT_SETTINGS, **configured}
+    return _settings
+
+
+class Span:
+    __slots__ = ("id", "parent_id", "name", "start", "end", "thread", "thread_id",
+                 "attributes", "error")
+
+    def __init__(self, name: str, parent_id: str, attributes: dict):
+        self.id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.name = name
+        self.start = time.perf_counter()
+        self.end = None
+        self.thread = threading.current_thread().name
+        self.thread_id = threading.get_ident()
+        self.attributes = attributes
+        self.error = None
+
+
+class Trace:
+    """
+    Spans recorded for one request or job, in the order they started.
+    """
+
+    def __init__(self, request_id: str, name: str, attributes: dict = None,
+                 profile: bool = False):
+        self.request_id = request_id
+        self.name = name
+        # Whether profiling was asked for, passed on to jobs the trace submits
+        self.profile = profile
+        self.attributes = attributes or {}
+        self.started_at = datetime.now(timezone.utc).isoformat()
+        self.start = time.perf_counter()
+        self.spans = []
+        # Open spans per thread. Pool threads are tracked only while they run
+        # one of this trace's spans; the trace's own thread for its lifetime.
+        self._open_spans = Counter({threading.get_ident(): 1})
+        self.error = None
+        self._lock = threading.Lock()
+
+    @property
+    def thread_ids(self) -> list[int]:
+        with self._lock:
+            return list(self._open_spans)
+
+    def add(self, span: Span):
+        with self._lock:
+            self.spans.append(span)
+            self._open_spans[span.thread_id] += 1
+
+    def finish(self, span: Span):
+        span.end = time.perf_counter()
+        with self._lock:
+            self._open_spans[span.thread_id] -= 1
+            if self._open_spans[span.thread_id] <= 0:
+                del self._open_spans[span.thread_id]
+
+    def to_dict(self, duration_ms: float, sampled_reason: str) -> dict:
+        with self._lock:
+            spans = list(self.spans)
+        return {
+            "request_id": self.request_id,
+            "name": self.name,
+            "started_at": self.started_at,
+            "duration_ms": round(duration_ms, 3),
+            "error": self.error,
+            "sampled_reason": sampled_reason,
+            "attributes": self.attributes,
+            "spans": [{
+                "id": span.id,
+                "parent_id": span.parent_id,
+                "name": span.name,
+                "start_ms": round((span.start - self.start) * 1000, 3),
+                "duration_ms": round(((span.end or time.perf_counter()) - span.start) * 1000, 3),
+                "thread": span.thread,
+                "attributes": span.attributes,
+                "error": span.error,
+            } for span in spans],
+        }
+
+
+class SamplingProfiler:
+    """
+    Samples the stacks of the threads a trace ran on every few
+    milliseconds and aggregates them as folded stacks (the input format of
+    flamegraph.pl and speedscope). Sampling follows work that hops from
+    the event loop to worker threads, which per-thread profilers miss.
+    """
+
+    def __init__(self, trace: Trace, interval_ms: float = 5):
+        self.trace = trace
+        self.interval = interval_ms / 1000
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="trace-profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self) -> Counter:
+        self._stop.set()
+        self._thread.join()
+        return self.stacks
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            for thread_id in self.trace.thread_ids:
+                frame = frames.get(thread_id)
+                if frame is None or thread_id == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(stack))] += 1
+
+
+def current_request_id():
+    trace = _current_trace.get()
+    return trace.request_id if trace else None
+
+
+def current_profile() -> bool:
+    trace = _current_trace.get()
+    return bool(trace and trace.profile)
+
+
+def valid_request_id(value: str = None) -> str:
+    """
+    `value` if it is usable as a request id (1-64 letters, digits, ".",
+    "_" or "-"), else a newly generated id.
+    """
+    if value and _REQUEST_ID.fullmatch(value) and value.strip(".") != "":
+        return value
+    return uuid.uuid4().hex
+
+
+@contextmanager
+def start_trace(name: str, request_id: str = None, profile: bool = False, **attributes):
+    """
+    Trace a request or job: binds its request id to every log line through
+    structlog contextvars, collects the spans opened inside, and exports the
+    timeline if tail sampling keeps it (errors, slow, profiled, or a random
+    share of the rest). With `profile`, also writes sampled stacks.
+    """
+    settings = tracing_settings()
+    request_id = valid_request_id(request_id)
+    if not settings["enabled"]:
+        with structlog.contextvars.bound_contextvars(request_id=request_id):
+            yield None
+        return
+
+    trace = Trace(request_id, name, attributes, profile=profile)
+    trace_token = _current_trace.set(trace)
+    span_token = _current_span.set(None)
+    profiler = None
+    if profile and settings["allow_profiling"]:
+        profiler = SamplingProfiler(trace, settings["profile_interval_ms"])
+        profiler.start()
+    try:
+        with structlog.contextvars.bound_contextvars(request_id=request_id):
+            yield trace
+    except BaseException as e:
+        trace.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        duration_ms = (time.perf_counter() - trace.start) * 1000
+        _current_span.reset(span_token)
+        _current_trace.reset(trace_token)
+        stacks = profiler.stop() if profiler else None
+        _finish_trace(trace, duration_ms, stacks, settings)
+
+
+def _finish_trace(trace: Trace, duration_ms: float, stacks, settings: dict):
+    if trace.error:
+        reason = "error"
+    elif duration_ms >= settings["slow_ms"]:
+        reason = "slow"
+    elif stacks is not None:
+        reason = "profiled"
+    elif random.random() < settings["sample_rate"]:
+        reason = "random"
+    else:
+        return
+    try:
+        export_dir = os.path.join(settings["export_dir"], datetime.now(timezone.utc).strftime("%Y%m%d"))
+        os.makedirs(export_dir, exist_ok=True)
+        # A request's jobs trace under its request id too, one file per attempt
+        stem = trace.request_id
+        if "job_id" in trace.attributes:
+            stem += f".{trace.attributes['job_id']}.{trace.attributes.get('attempt', 1)}"
+        path = os.path.join(export_dir, f"{stem}.json")
+        with open(path, "w") as f:
+            json.dump(trace.to_dict(duration_ms, reason), f, default=str)
+        if stacks is not None:
+            with open(os.path.join(export_dir, f"{stem}.folded"), "w") as f:
+                f.writelines(f"{stack} {count}\n" for stack, count in stacks.most_common())
+        log.info("Trace exported", request_id=trace.request_id, path=path,
+                 duration_ms=round(duration_ms, 1), reason=reason)
+    except Exception as e:
+        log.error("Trace export failed", request_id=trace.request_id, error=str(e))
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """
+    Time a stage of the current trace; a no-op outside a trace. Yields the
+    span (or None) so callers can add attributes known only at the end.
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        yield None
+        return
+    parent = _current_span.get()
+    current = Span(name, parent.id if parent else None, attributes)
+    trace.add(current)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        trace.finish(current)
+        _current_span.reset(token)
+
+
+def traced(name: str = None):
+    """
+    Decorator form of `span`, named after the function by default.
+    """
+    def decorator(func):
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
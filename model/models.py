@@ -1,5 +1,5 @@
 from pydantic import BaseModel, RootModel
-from typing import List, Union
+from typing import List, Optional, Union
 from enum import Enum
 
 
@@ -15,6 +15,11 @@ class Metadata(BaseModel):
     SentimentTone: str
 
 
+class SummaryTone(BaseModel):
+    Summary: List[str]
+    SentimentTone: str
+
+
 class ChangesFormat(BaseModel):
     Pages: str
     Changes: str
@@ -28,4 +33,35 @@ class PromptType(str, Enum):
     DOCUMENT_ANALYSIS = "document_analysis",
     DOCMENT_COMPARISON = "document_compare",
     CONTEXTUALIZE_QUESTION = "contextualize_question",
-    CONTEXT_QA = "context_qa"
+    CONTEXT_QA = "context_qa",
+    DOCUMENT_SUMMARY = "document_summary",
+    SECTION_SUMMARY = "section_summary",
+    DOCUMENT_SUMMARY_ROLLUP = "document_summary_rollup",
+    CONVERSATION = "conversation"
+
+
+class SavedDocument(BaseModel):
+    file_name: str
+    file_path: str
+    file_type: str
+    content_hash: str
+    size_bytes: int
+
+
+class SearchFilters(BaseModel):
+    session_ids: Optional[List[str]] = None
+    modes: Optional[List[str]] = None
+    file_types: Optional[List[str]] = None
+    sources: Optional[List[str]] = None
+    created_after: Optional[str] = None  # ISO-8601, compared with the index header
+    created_before: Optional[str] = None
+
+
+class RouteDecision(BaseModel):
+    intent: str  # chitchat, meta_followup, lookup, broad or complex
+    needs_rewrite: bool
+    needs_retrieval: bool
+    use_summaries: bool
+    model_tier: str  # key of router.tiers in config
+    complexity: float
+    reason: str
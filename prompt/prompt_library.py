@@ -13,6 +13,20 @@ document_analysis_prompt = ChatPromptTemplate.from_template(
     """
 )
 
+# Prompt for the fast analysis mode: only summary and tone come from the LLM
+document_summary_prompt = ChatPromptTemplate.from_template(
+    """
+    You are a highly capable assistant trained to summarize documents.
+    The text below is a selection of the most representative sentences of a document.
+    Return ONLY valid JSON matching the exact schema below.
+
+    {format_instructions}
+
+    Key sentences:
+    {document_content}
+    """
+)
+
 document_comparison_prompt = ChatPromptTemplate.from_template(
     """
     You will be provided with content from two PDFs. Your task are as follows:
@@ -54,9 +68,46 @@ context_qa_prompt = ChatPromptTemplate.from_messages([
     ("human", "{input}"),
 ])
 
+# Prompt for turns the router answers from the conversation alone
+conversation_prompt = ChatPromptTemplate.from_messages([
+    ("system", (
+        "You are the assistant of a document portal. Reply to the user's latest message using only the "
+        "conversation so far; if it asks for something that is not there, ask them to rephrase the question "
+        "about their documents. Keep your answer concise."
+    )),
+    MessagesPlaceholder("chat_history"),
+    ("human", "{input}"),
+])
+
+# Prompts for the hierarchical summary index built at ingestion time
+section_summary_prompt = ChatPromptTemplate.from_template(
+    """
+    Summarize the following section of the document "{source}" in at most five sentences.
+    Keep names, numbers and conclusions. Do not add information that is not in the text.
+
+    Section: {heading}
+
+    {section_text}
+    """
+)
+
+document_summary_rollup_prompt = ChatPromptTemplate.from_template(
+    """
+    Below are summaries of the sections of the document "{source}", in order.
+    Write an overview of the whole document in at most eight sentences, covering its purpose,
+    main points and conclusions.
+
+    {section_summaries}
+    """
+)
+
 PROMPT_REGISTRY = {
     "document_analysis": document_analysis_prompt,
     "document_compare": document_comparison_prompt,
     "contextualize_question": contextualize_question_prompt,
     "context_qa": context_qa_prompt,
+    "document_summary": document_summary_prompt,
+    "section_summary": section_summary_prompt,
+    "document_summary_rollup": document_summary_rollup_prompt,
+    "conversation": conversation_prompt,
 }
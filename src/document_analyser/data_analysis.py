@@ -1,11 +1,15 @@
 import os
+import sys
 from utils.model_loader import ModelLoader
 from logger.custom_logger import CustomLogger
+from logger.tracing import span
 from exception.custom_exception_archive import DocumentPortalException
 from model.models import *
 from langchain_core.output_parsers import JsonOutputParser
 from langchain.output_parsers import OutputFixingParser
 from prompt.prompt_library import PROMPT_REGISTRY
+from utils.LLm_utils import select_key_sentences
+from src.document_analyser.metadata_extractor import LocalMetadataExtractor
 
 
 class DocumentAnalyser:
@@ -27,6 +31,18 @@ class DocumentAnalyser:
 
             self.prompt = PROMPT_REGISTRY["document_analysis"]
 
+            # Fast mode: deterministic fields come from document properties,
+            # the LLM only writes the summary and tone
+            analysis_config = self.loader.config.get("analysis", {})
+            self.mode = analysis_config.get("mode", "full")
+            self.summary_token_budget = int(
+                analysis_config.get("summary_token_budget", 2000))
+            self.extractor = LocalMetadataExtractor()
+            self.summary_parser = JsonOutputParser(pydantic_object=SummaryTone)
+            self.summary_fixing_parser = OutputFixingParser.from_llm(
+                parser=self.summary_parser, llm=self.llm)
+            self.summary_prompt = PROMPT_REGISTRY[PromptType.DOCUMENT_SUMMARY.value]
+
             self.log.info("DocumentAnalyser initialized successfully.")
 
         except Exception as e:
@@ -39,14 +55,18 @@ class DocumentAnalyser:
         Analyse a document's text and extract stuctured metadata and summary.
         """
         try:
-            chain = self.prompt | self.llm | self.fixing_parser
+            chain = self.prompt | self.llm
 
             self.log.info("Metadata analysis chain initialized.")
 
-            response = chain.invoke({
-                "format_instructions": self.parser.get_format_instructions(),
-                "document_content": document_text
-            })
+            # LLM call and (possibly self-correcting) parse are timed separately
+            with span("analyser.llm", input_chars=len(document_text)):
+                message = chain.invoke({
+                    "format_instructions": self.parser.get_format_instructions(),
+                    "document_content": document_text
+                })
+            with span("analyser.parse"):
+                response = self.fixing_parser.invoke(message)
 
             self.log.info("Metadata extraction successful.",
                           keys=list(response.keys()))
@@ -56,6 +76,54 @@ class DocumentAnalyser:
             raise DocumentPortalException(
                 "Metadata extraction failed", error_details=str(e)) from e
 
+    def analyze_file(self, file_path: str) -> dict:
+        """
+        Analyse a saved document, using the configured analysis mode.
+        """
+        with span("analyser.analyze_file", mode=self.mode):
+            if self.mode == "fast":
+                return self.analyze_document_fast(file_path)
+            _, text = self.extractor.extract(file_path)
+            return self.analyze_document(text)
+
+    def analyze_document_fast(self, file_path: str) -> dict:
+        """
+        Fill the deterministic metadata fields from the document properties
+        and ask the LLM only for Summary and SentimentTone, based on a
+        token-budgeted selection of key sentences.
+        """
+        try:
+            metadata, text = self.extractor.extract(file_path)
+            with span("analyser.select_sentences"):
+                key_sentences = select_key_sentences(
+                    text, self.summary_token_budget)
+
+            chain = self.summary_prompt | self.llm
+            self.log.info("Fast summary chain initialized.",
+                          selected_chars=len(key_sentences),
+                          total_chars=len(text))
+
+            with span("analyser.llm", input_chars=len(key_sentences)):
+                message = chain.invoke({
+                    "format_instructions": self.summary_parser.get_format_instructions(),
+                    "document_content": key_sentences
+                })
+            with span("analyser.parse"):
+                summary = self.summary_fixing_parser.invoke(message)
+
+            response = Metadata(
+                **metadata,
+                Summary=summary["Summary"],
+                SentimentTone=summary["SentimentTone"],
+            ).model_dump()
+            self.log.info("Fast metadata extraction successful.",
+                          keys=list(response.keys()))
+            return response
+        except Exception as e:
+            self.log.error("Fast metadata analysis failed", error=str(e))
+            raise DocumentPortalException(
+                "Fast metadata extraction failed", sys) from e
+
 
 """
 Explannation for Chain invoker:
@@ -0,0 +1,127 @@
+import re
+import sys
+from pathlib import Path
+from langdetect import DetectorFactory, detect
+from logger.custom_logger import CustomLogger
+from logger.tracing import span
+from src.document_ingestion.artifact_cache import load_document_artifact
+from exception.custom_exception_archive import DocumentPortalException
+
+NOT_AVAILABLE = "Not Available"
+
+# Keep language detection deterministic between runs
+DetectorFactory.seed = 0
+
+LANGUAGE_NAMES = {
+    "en": "English", "de": "German", "fr": "French", "es": "Spanish",
+    "it": "Italian", "pt": "Portuguese", "nl": "Dutch", "hi": "Hindi",
+    "zh-cn": "Chinese", "zh-tw": "Chinese", "ja": "Japanese", "ko": "Korean",
+    "ru": "Russian", "ar": "Arabic",
+}
+
+
+class LocalMetadataExtractor:
+    """
+    Extracts the deterministic Metadata fields (title, authors, dates,
+    publisher, page count, language) from document properties without the LLM.
+    """
+
+    def __init__(self):
+        self.log = CustomLogger().get_logger(__name__)
+
+    def extract(self, file_path: str) -> tuple[dict, str]:
+        """
+        Return the locally available metadata fields and the document text.
+        """
+        try:
+            extension = Path(file_path).suffix.lower()
+            with span("extract.text", file_type=extension):
+                # Parsed once per content hash and shared with compare and chat
+                artifact = load_document_artifact(file_path)
+                text = "\n".join(artifact["pages"])
+                if extension == ".pdf":
+                    metadata = self._pdf_metadata(file_path, artifact)
+                elif extension == ".docx":
+                    metadata = self._docx_metadata(file_path, artifact)
+                else:
+                    metadata = {
+                        "Title": Path(file_path).stem,
+                        "Author": [NOT_AVAILABLE],
+                        "DateCreated": NOT_AVAILABLE,
+                        "LastModifiedDate": NOT_AVAILABLE,
+                        "Publisher": NOT_AVAILABLE,
+                        "PagCount": NOT_AVAILABLE,
+                    }
+
+            with span("extract.language"):
+                metadata["Language"] = self.detect_language(text)
+            self.log.info("Local metadata extracted", file_path=file_path,
+                          fields=list(metadata.keys()))
+            return metadata, text
+
+        except Exception as e:
+            self.log.error("Local metadata extraction failed",
+                           error=str(e), file_path=file_path)
+            raise DocumentPortalException(
+                "Local metadata extraction failed", sys) from e
+
+    def _pdf_metadata(self, file_path: str, artifact: dict) -> dict:
+        props = artifact["properties"]
+        return {
+            "Title": props.get("title") or Path(file_path).stem,
+            "Author": self._split_authors(props.get("author")),
+            "DateCreated": self._format_pdf_date(props.get("creationDate")),
+            "LastModifiedDate": self._format_pdf_date(props.get("modDate")),
+            # The info dictionary has no publisher; only XMP (dc:publisher) carries one
+            "Publisher": self._xmp_publisher(props.get("xmp")),
+            "PagCount": artifact["page_count"],
+        }
+
+    def _docx_metadata(self, file_path: str, artifact: dict) -> dict:
+        props = artifact["properties"]
+        return {
+            "Title": props.get("title") or Path(file_path).stem,
+            "Author": self._split_authors(props.get("author")),
+            "DateCreated": props.get("created") or NOT_AVAILABLE,
+            "LastModifiedDate": props.get("modified") or NOT_AVAILABLE,
+            "Publisher": NOT_AVAILABLE,
+            "PagCount": artifact["page_count"] or NOT_AVAILABLE,
+        }
+
+    @staticmethod
+    def detect_language(text: str) -> str:
+        """
+        Detect the document language from a sample of its text.
+        """
+        sample = text[:5000].strip()
+        if not sample:
+            return NOT_AVAILABLE
+        try:
+            code = detect(sample)
+        except Exception:
+            return NOT_AVAILABLE
+        return LANGUAGE_NAMES.get(code, code)
+
+    @staticmethod
+    def _xmp_publisher(xmp: str) -> str:
+        match = re.search(
+            r"<dc:publisher>.*?<rdf:li[^>]*>(.*?)</rdf:li>", xmp or "", re.S)
+        return match.group(1).strip() if match else NOT_AVAILABLE
+
+    @staticmethod
+    def _split_authors(author) -> list[str]:
+        if not author:
+            return [NOT_AVAILABLE]
+        parts = re.split(r";|,|\band\b", author)
+        return [p.strip() for p in parts if p.strip()] or [NOT_AVAILABLE]
+
+    @staticmethod
+    def _format_pdf_date(value) -> str:
+        """
+        Convert a PDF date string such as "D:20171204123000Z" to YYYY-MM-DD.
+        """
+        match = re.match(r"D?:?(\d{4})(\d{2})?(\d{2})?", value or "")
+        if not match:
+            return NOT_AVAILABLE
+        year, month, day = match.group(1), match.group(2) or "01", match.group(3) or "01"
+        return f"{year}-{month}-{day}"
@@ -0,0 +1,163 @@
+import numpy as np
+from langchain_core.documents import Document
+from logger.custom_logger import CustomLogger
+from utils.LLm_utils import count_tokens
+
+# How far into the next chunk to look for text it shares with the previous one
+MAX_OVERLAP_CHARS = 1000
+# Shorter matches found without the offsets' backing are coincidence
+# ("heads" + "sentences"), not shared text
+MIN_OVERLAP_CHARS = 20
+
+
+class ContextPacker:
+    """
+    Turns retrieved chunks into the `{context}` of context_qa_prompt:
+    merges adjacent/overlapping chunks of the same source, drops
+    near-duplicates, diversifies with MMR and fills a token budget.
+    """
+
+    def __init__(self, max_context_tokens: int = 2500, duplicate_threshold: float = 0.95,
+                 mmr_lambda: float = 0.7, merge_gap_chars: int = 0):
+        self.log = CustomLogger().get_logger(__name__)
+        self.max_context_tokens = max_context_tokens
+        self.duplicate_threshold = duplicate_threshold
+        self.mmr_lambda = mmr_lambda
+        self.merge_gap_chars = merge_gap_chars
+
+    @classmethod
+    def from_config(cls, config: dict) -> "ContextPacker":
+        packing = config.get("context_packing", {})
+        return cls(
+            max_context_tokens=int(packing.get("max_context_tokens", 2500)),
+            duplicate_threshold=float(packing.get("duplicate_threshold", 0.95)),
+            mmr_lambda=float(packing.get("mmr_lambda", 0.7)),
+            merge_gap_chars=int(packing.get("merge_gap_chars", 0)),
+        )
+
+    def pack(self, hits: list[tuple[Document, float, np.ndarray]], query_vector) -> str:
+        """
+        Pack (document, score, unit vector) hits into a context string.
+        """
+        if not hits:
+            return ""
+        docs, scores, vectors = self.merge_adjacent(hits)
+        docs, scores, vectors = self.drop_near_duplicates(docs, scores, vectors)
+        order = self.mmr_order(scores, vectors, query_vector)
+
+        parts, used = [], 0
+        for i in order:
+            part = self._format(docs[i])
+            cost = count_tokens(part)
+            if used + cost > self.max_context_tokens:
+                continue
+            parts.append(part)
+            used += cost
+
+        self.log.info("Context packed", retrieved=len(hits), merged=len(docs),
+                      packed=len(parts), context_tokens=used)
+        return "\n\n".join(parts)
+
+    def merge_adjacent(self, hits):
+        """
+        Merge chunks from the same source whose character ranges touch or
+        overlap, keeping the best score and a renormalised mean vector.
+        """
+        groups = {}
+        standalone = []
+        for doc, score, vector in hits:
+            meta = doc.metadata
+            if meta.get("start_index", -1) < 0:
+                standalone.append((doc, score, vector))
+                continue
+            key = (meta.get("session_id"), meta.get("source"))
+            groups.setdefault(key, []).append((doc, score, vector))
+
+        merged = list(standalone)
+        for group in groups.values():
+            group.sort(key=lambda hit: hit[0].metadata["start_index"])
+            current = group[0]
+            for hit in group[1:]:
+                if hit[0].metadata["start_index"] <= \
+                        current[0].metadata["end_index"] + self.merge_gap_chars:
+                    current = self._merge(current, hit)
+                else:
+                    merged.append(current)
+                    current = hit
+            merged.append(current)
+
+        merged.sort(key=lambda hit: -hit[1])
+        docs = [doc for doc, _, _ in merged]
+        scores = np.array([score for _, score, _ in merged], dtype=np.float32)
+        vectors = np.vstack([vector for _, _, vector in merged]).astype(np.float32)
+        return docs, scores, vectors
+
+    @staticmethod
+    def _merge(first, second):
+        doc_a, score_a, vector_a = first
+        doc_b, score_b, vector_b = second
+        text_a, text_b = doc_a.page_content, doc_b.page_content
+        # Drop the prefix of the second chunk already at the end of the first,
+        # trusting the offsets first and searching for the longest match otherwise
+        overlap = doc_a.metadata["end_index"] - doc_b.metadata["start_index"]
+        if not (0 < overlap <= len(text_b) and text_a.endswith(text_b[:overlap])):
+            overlap = 0
+            for size in range(min(len(text_a), len(text_b), MAX_OVERLAP_CHARS),
+                              MIN_OVERLAP_CHARS - 1, -1):
+                if text_a.endswith(text_b[:size]):
+                    overlap = size
+                    break
+        text = text_a + ("" if overlap else "\n") + text_b[overlap:]
+        metadata = {**doc_a.metadata,
+                    "end_index": max(doc_a.metadata["end_index"], doc_b.metadata["end_index"]),
+                    "page_end": doc_b.metadata.get("page", doc_a.metadata.get("page"))}
+        vector = vector_a + vector_b
+        vector = vector / (np.linalg.norm(vector) or 1.0)
+        return Document(page_content=text, metadata=metadata), max(score_a, score_b), vector
+
+    def drop_near_duplicates(self, docs, scores, vectors):
+        """
+        Keep a chunk only if its cosine similarity to every better-scored
+        kept chunk stays below the threshold.
+        """
+        similarity = vectors @ vectors.T
+        keep = []
+        for i in range(len(docs)):  # already sorted by score
+            if keep and similarity[i, keep].max() >= self.duplicate_threshold:
+                continue
+            keep.append(i)
+        return [docs[i] for i in keep], scores[keep], vectors[keep]
+
+    def mmr_order(self, scores, vectors, query_vector) -> list[int]:
+        """
+        Maximal Marginal Relevance ordering of the remaining chunks.
+        """
+        query = np.asarray(query_vector, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+        relevance = vectors @ query
+        similarity = vectors @ vectors.T
+
+        selected = []
+        remaining = np.ones(len(scores), dtype=bool)
+        redundancy = np.zeros(len(scores), dtype=np.float32)
+        while remaining.any():
+            mmr = self.mmr_lambda * relevance - (1 - self.mmr_lambda) * redundancy
+            mmr[~remaining] = -np.inf
+            best = int(np.argmax(mmr))
+            selected.append(best)
+            remaining[best] = False
+            redundancy = np.maximum(redundancy, similarity[best])
+        return selected
+
+    @staticmethod
+    def _format(doc: Document) -> str:
+        meta = doc.metadata
+        page = meta.get("page")
+        page_end = meta.get("page_end")
+        pages = f"p.{page}-{page_end}" if page_end and page_end != page else f"p.{page}"
+        label = f"{meta.get('source', 'unknown')} {pages}"
+        if meta.get("level"):
+            label += f" {meta['level']} summary"
+            if meta.get("heading"):
+                label += f": {meta['heading']}"
+        return f"[{label}]\n{doc.page_content}"
@@ -0,0 +1,207 @@
+import re
+import threading
+import numpy as np
+from logger.custom_logger import CustomLogger
+from model.models import RouteDecision
+from utils.LLm_utils import count_tokens
+
+_GREETING = re.compile(
+    r"^\s*(hi|hello|hey|hiya|good (morning|afternoon|evening)|thanks?( you)?|thank you|"
+    r"thx|ok(ay)?|cool|great|bye|goodbye|see you)\b[\s!.,?]*(there|so much|a lot)?[\s!.,?]*$",
+    re.IGNORECASE)
+# Requests about the previous answer itself, answerable from history alone:
+# a rewording verb that refers back to the answer and names no document
+_META_FOLLOWUP = re.compile(
+    r"\b(rephrase|reword|shorten|summari[sz]e|simplify|translate|repeat|bullet points?|"
+    r"say (that|it) again|in simpler terms|make (it|that) (shorter|simpler|clearer))\b",
+    re.IGNORECASE)
+_PREVIOUS_ANSWER = re.compile(
+    r"\b(your|the) (last |previous )?(answer|response|reply)\b|"
+    r"\bwhat you (just )?(said|wrote)\b|\babove\b", re.IGNORECASE)
+_ANSWER_REFERENCE = re.compile(r"\b(that|it)\b", re.IGNORECASE)
+_DOCUMENT_NOUN = re.compile(
+    r"\b(document|report|paper|file|pdf|article|section|chapter|page|contract|docs?)s?\b",
+    re.IGNORECASE)
+_ANAPHORA = re.compile(
+    r"\b(it|its|that|this|these|those|they|them|their|he|she|his|her|the same|above|"
+    r"previous|former|latter)\b|^\s*(and|also|what about|how about|why|so)\b", re.IGNORECASE)
+# Questions about a whole document or corpus rather than a specific fact
+_BROAD = re.compile(
+    r"\b(summari[sz]e|summary|overview|overall|main (topic|point|idea|finding)s?|"
+    r"what (is|are) (this|these|the) (document|report|paper|file)s?( all)? about|"
+    r"key (points|takeaways|findings)|gist|tl;?dr)\b|\ball (the |three |\d+ )?(files|documents)\b",
+    re.IGNORECASE)
+_COMPLEX = re.compile(
+    r"\b(compare|comparison|contrast|differen(ce|t)|why|how does|how do|explain|analy[sz]e|"
+    r"evaluate|implications?|trade-?offs?|pros and cons|step by step|reason|justify|"
+    r"relationship|impact)\b", re.IGNORECASE)
+
+# Example queries per intent; their embedding centroids form the classifier
+INTENT_PROTOTYPES = {
+    "chitchat": [
+        "hello, how are you?", "thanks, that was helpful", "good morning",
+        "who are you?", "nice, thank you very much",
+    ],
+    "meta_followup": [
+        "can you make that shorter?", "rephrase your last answer",
+        "put that in bullet points", "explain it in simpler words",
+        "translate that to French",
+    ],
+    "lookup": [
+        "what is the batch number of the product?", "when was the report published?",
+        "what BLEU score did the model get?", "who are the authors?",
+        "what is the dropout rate used?",
+    ],
+    "broad": [
+        "what is this document about?", "summarise all the files",
+        "give me an overview of the report", "what are the key takeaways?",
+        "what are the main findings?",
+    ],
+    "complex": [
+        "compare the two approaches and explain the trade-offs",
+        "why does self-attention scale better than recurrence?",
+        "analyse the impact of the policy changes on the market",
+        "explain step by step how the encoder and decoder interact",
+        "what are the differences between version 1 and version 2 and why do they matter?",
+    ],
+}
+
+# Intent centroids per embedding model, computed once per process
+_centroid_cache = {}
+_centroid_lock = threading.Lock()
+
+
+def _intent_centroids(embeddings) -> tuple[list[str], np.ndarray]:
+    key = (type(embeddings).__qualname__, getattr(embeddings, "model", None))
+    with _centroid_lock:
+        if key not in _centroid_cache:
+            labels, centroids = [], []
+            for label, examples in INTENT_PROTOTYPES.items():
+                vectors = np.asarray(embeddings.embed_documents(examples), dtype=np.float32)
+                vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+                centroid = vectors.mean(axis=0)
+                labels.append(label)
+                centroids.append(centroid / (np.linalg.norm(centroid) or 1.0))
+            _centroid_cache[key] = (labels, np.vstack(centroids))
+        return _centroid_cache[key]
+
+
+class QueryRouter:
+    """
+    Cheap, local per-query routing for chat: decides whether the question
+    needs rewriting against history, whether retrieval is needed at all,
+    whether summary nodes or leaf chunks fit, and which model tier to use.
+    Regex heuristics decide the clear cases; a nearest-centroid classifier
+    over query embeddings handles the rest.
+    """
+
+    def __init__(self, embeddings, config: dict):
+        self.log = CustomLogger().get_logger(__name__)
+        router_config = config.get("router", {})
+        self.enabled = router_config.get("enabled", True)
+        self.tiers = router_config.get("tiers", {})
+        self.complexity_threshold = float(router_config.get("complexity_threshold", 0.5))
+        self.min_confidence = float(router_config.get("min_confidence", 0.35))
+        self.embeddings = embeddings
+
+    def route(self, question: str, chat_history: list, query_vector=None) -> RouteDecision:
+        """
+        Decide how to answer `question`. `query_vector` is the embedding of
+        the raw question if the caller already has it.
+        """
+        return self.route_by_rules(question, chat_history) or \
+            self.classify_route(question, chat_history, query_vector)
+
+    def route_by_rules(self, question: str, chat_history: list):
+        """
+        The decision for questions the regex heuristics settle on their own,
+        else None. Needs no embedding.
+        """
+        has_history = bool(chat_history)
+        if not self.enabled:
+            return self._decision("lookup", has_history, True, 1.0, "router disabled")
+
+        if _GREETING.match(question):
+            return self._decision("chitchat", False, False, 0.0, "greeting pattern")
+        # Broad before follow-up: "summarise this report" is about the documents
+        if _BROAD.search(question) and not (has_history and _PREVIOUS_ANSWER.search(question)):
+            return self._decision("broad", self.needs_rewrite(question, chat_history), True,
+                                  self.complexity(question, "broad"), "broad pattern")
+        if has_history and self._is_meta_followup(question):
+            return self._decision("meta_followup", False, False, 0.0, "follow-up on last answer")
+        return None
+
+    def classify_route(self, question: str, chat_history: list, query_vector=None,
+                       rewritten: bool = False) -> RouteDecision:
+        """
+        Route by the intent classifier. With `rewritten`, `question` has
+        already been made standalone and needs no further rewrite.
+        """
+        has_history = bool(chat_history)
+        intent, confidence = self.classify(question, query_vector)
+        if intent in ("chitchat", "meta_followup") and (
+                confidence < self.min_confidence or not has_history):
+            # Without history there is nothing to answer from but the documents
+            intent = "lookup"
+
+        needs_retrieval = intent not in ("chitchat", "meta_followup")
+        needs_rewrite = needs_retrieval and (
+            rewritten or self.needs_rewrite(question, chat_history))
+        complexity = self.complexity(question, intent)
+        return self._decision(intent, needs_rewrite, needs_retrieval, complexity,
+                              f"classifier confidence {confidence:.2f}")
+
+    @staticmethod
+    def needs_rewrite(question: str, chat_history: list) -> bool:
+        """
+        Whether the question leans on history to be understood on its own.
+        """
+        return bool(chat_history) and (
+            bool(_ANAPHORA.search(question)) or len(question.split()) < 4)
+
+    @staticmethod
+    def _is_meta_followup(question: str) -> bool:
+        return bool(_META_FOLLOWUP.search(question)) and \
+            bool(_PREVIOUS_ANSWER.search(question) or _ANSWER_REFERENCE.search(question)) and \
+            not _DOCUMENT_NOUN.search(question)
+
+    def classify(self, question: str, query_vector=None) -> tuple[str, float]:
+        """
+        Nearest intent centroid by cosine similarity.
+        """
+        labels, centroids = _intent_centroids(self.embeddings)
+        if query_vector is None:
+            query_vector = self.embeddings.embed_query(question)
+        query = np.asarray(query_vector, dtype=np.float32)
+        scores = centroids @ (query / (np.linalg.norm(query) or 1.0))
+        best = int(np.argmax(scores))
+        return labels[best], float(scores[best])
+
+    @staticmethod
+    def complexity(question: str, intent: str) -> float:
+        """
+        Rough 0..1 estimate of how much reasoning the answer needs.
+        """
+        score = min(count_tokens(question) / 60, 0.4)
+        score += 0.2 * min(len(_COMPLEX.findall(question)), 2)
+        score += 0.1 * min(question.count(",") + question.count(" and "), 2)
+        if intent == "complex":
+            score += 0.3
+        elif intent == "broad":
+            score += 0.2
+        return min(score, 1.0)
+
+    def _decision(self, intent: str, needs_rewrite: bool, needs_retrieval: bool,
+                  complexity: float, reason: str) -> RouteDecision:
+        tier = "heavy" if complexity >= self.complexity_threshold else "light"
+        decision = RouteDecision(
+            intent=intent,
+            needs_rewrite=needs_rewrite,
+            needs_retrieval=needs_retrieval,
+            use_summaries=intent == "broad",
+            model_tier=tier,
+            complexity=round(complexity, 3),
+            reason=reason,
+        )
+        self.log.info("Query routed", **decision.model_dump())
+        return decision
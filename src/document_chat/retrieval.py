@@ -0,0 +1,202 @@
+import os
+import sys
+import json
+import uuid
+import threading
+from langchain_core.messages import HumanMessage, AIMessage, messages_from_dict, messages_to_dict
+from langchain_core.output_parsers import StrOutputParser
+from logger.custom_logger import CustomLogger
+from logger.tracing import span
+from exception.custom_exception_archive import DocumentPortalException
+from model.models import PromptType, SearchFilters
+from prompt.prompt_library import PROMPT_REGISTRY
+from utils.model_loader import ModelLoader
+from utils.path_utils import path_under
+from src.document_chat.sharded_retriever import ShardedSearch
+from src.document_chat.context_packer import ContextPacker
+from src.document_chat.query_router import QueryRouter
+from src.document_ingestion.summary_index import SUMMARY_LAYER
+from src.document_ingestion.session_snapshot import SessionSnapshotter, HISTORY_FILE
+
+
+class ConversationalRAG:
+    """
+    Conversational question answering over a chat session's index.
+    Retrieved chunks are packed (merged, deduplicated, diversified and
+    budgeted) before they reach context_qa_prompt. A QueryRouter decides
+    per turn whether to rewrite, whether to retrieve, and which model tier
+    answers. Turns of one session are answered one at a time.
+    """
+
+    def __init__(self, session_id: str, tenant_id: str = "default",
+                 filters: SearchFilters = None, search: ShardedSearch = None):
+        self.log = CustomLogger().get_logger(__name__)
+        try:
+            self.session_id = session_id
+            self.tenant_id = tenant_id
+            self.loader = ModelLoader()
+            self.config = self.loader.config
+            self.llm = self.loader.load_llm()
+            self.embeddings = self.loader.load_embeddings()
+
+            self.search = search or ShardedSearch(tenant_id=tenant_id)
+            if self.config.get("snapshots", {}).get("enabled", False):
+                # A session indexed on another worker is picked up from its snapshot
+                SessionSnapshotter(index_dir=os.path.dirname(self.search.root)).ensure_local(
+                    tenant_id, session_id)
+            self.summary_search = ShardedSearch(
+                tenant_id=tenant_id, index_dir=os.path.dirname(self.search.root),
+                layer=SUMMARY_LAYER)
+            self.filters = filters or SearchFilters(session_ids=[session_id])
+            self.packer = ContextPacker.from_config(self.config)
+            self.candidate_k = int(self.config.get("context_packing", {}).get(
+                "candidate_k", self.config["retriever"]["top_k"]))
+
+            self.router = QueryRouter(self.embeddings, self.config)
+            self._llms = {None: self.llm}
+
+            self.contextualize_prompt = PROMPT_REGISTRY[PromptType.CONTEXTUALIZE_QUESTION.value]
+            self.qa_prompt = PROMPT_REGISTRY[PromptType.CONTEXT_QA.value]
+            self.conversation_prompt = PROMPT_REGISTRY[PromptType.CONVERSATION.value]
+
+            self.history_path = os.path.join(path_under(self.search.root, session_id), HISTORY_FILE)
+            self._lock = threading.Lock()
+            self._history_mtime = None
+            self.chat_history = self._load_history()
+
+            self.log.info("ConversationalRAG initialized", session_id=session_id,
+                          tenant_id=tenant_id)
+        except Exception as e:
+            self.log.error("Error initializing ConversationalRAG", error=str(e))
+            raise DocumentPortalException("Error initializing ConversationalRAG", sys) from e
+
+    def invoke(self, user_input: str) -> str:
+        """
+        Answer a question using the session's documents and chat history.
+        """
+        with self._lock:
+            return self._invoke(user_input)
+
+    def _invoke(self, user_input: str) -> str:
+        try:
+            if self._history_changed():
+                # Another worker (or an import) wrote the history since we read it
+                self.chat_history = self._load_history()
+            question, query_vector = user_input, None
+            with span("chat.route") as route_span:
+                # Greetings, follow-ups and broad questions are routed by rules
+                # alone; only the classifier needs the question embedded
+                route = self.router.route_by_rules(user_input, self.chat_history)
+                if route is None:
+                    rewritten = self.router.needs_rewrite(user_input, self.chat_history)
+                    if rewritten:
+                        # Classify and search with the standalone question, so
+                        # the turn is embedded once
+                        question = self._rewrite(user_input)
+                    with span("chat.embed_query"):
+                        query_vector = self.embeddings.embed_query(question)
+                    route = self.router.classify_route(
+                        question, self.chat_history, query_vector, rewritten=rewritten)
+                if route_span:
+                    route_span.attributes.update(intent=route.intent, tier=route.model_tier)
+            llm = self.llm_for_tier(route.model_tier)
+
+            if route.needs_rewrite and question is user_input:
+                question = self._rewrite(user_input)
+
+            if route.needs_retrieval:
+                context = self.retrieve_context(question, route.use_summaries, query_vector)
+                with span("chat.llm", tier=route.model_tier):
+                    answer = (self.qa_prompt | llm | StrOutputParser()).invoke({
+                        "context": context,
+                        "input": user_input,
+                        "chat_history": self.chat_history,
+                    })
+            else:
+                with span("chat.llm", tier=route.model_tier):
+                    answer = (self.conversation_prompt | llm | StrOutputParser()).invoke({
+                        "input": user_input,
+                        "chat_history": self.chat_history,
+                    })
+
+            self.chat_history.extend([HumanMessage(content=user_input),
+                                      AIMessage(content=answer)])
+            self._save_history()
+            self.log.info("Chat answered", session_id=self.session_id,
+                          question=question, intent=route.intent,
+                          model_tier=route.model_tier, answer_preview=answer[:150])
+            return answer
+        except Exception as e:
+            self.log.error("Failed to answer question", error=str(e),
+                           session_id=self.session_id)
+            raise DocumentPortalException("Failed to answer question", sys) from e
+
+    def _rewrite(self, user_input: str) -> str:
+        # Rewriting is a small task; the light tier handles it
+        with span("chat.rewrite"):
+            return (self.contextualize_prompt | self.llm_for_tier("light")
+                    | StrOutputParser()).invoke(
+                {"input": user_input, "chat_history": self.chat_history})
+
+    def llm_for_tier(self, tier: str):
+        """
+        LLM configured for a router tier, loaded once per session.
+        """
+        provider_key = self.router.tiers.get(tier)
+        if provider_key not in self._llms:
+            try:
+                self._llms[provider_key] = self.loader.load_llm(provider_key)
+            except Exception as e:
+                self.log.warning("Tier model unavailable, using default", tier=tier,
+                                 provider_key=provider_key, error=str(e))
+                self._llms[provider_key] = self.llm
+        return self._llms[provider_key]
+
+    def retrieve_context(self, question: str, use_summaries: bool = False,
+                         query_vector=None) -> str:
+        """
+        Retrieve candidates and pack them into the prompt context. Broad
+        questions go to the session's summary nodes when they exist,
+        specific ones to the leaf chunks.
+        """
+        if query_vector is None:
+            with span("chat.embed_query"):
+                query_vector = self.embeddings.embed_query(question)
+        if use_summaries:
+            with span("chat.search", layer=SUMMARY_LAYER):
+                hits = self.summary_search.search_with_vectors(
+                    query_vector, self.candidate_k, self.filters)
+            if hits:
+                self.log.info("Routed to summary index", session_id=self.session_id)
+                with span("chat.pack", hits=len(hits)):
+                    return self.packer.pack(hits, query_vector)
+        with span("chat.search"):
+            hits = self.search.search_with_vectors(query_vector, self.candidate_k, self.filters)
+        with span("chat.pack", hits=len(hits)):
+            return self.packer.pack(hits, query_vector)
+
+    def _history_changed(self) -> bool:
+        try:
+            return os.stat(self.history_path).st_mtime_ns != self._history_mtime
+        except FileNotFoundError:
+            return False
+
+    def _load_history(self) -> list:
+        if not os.path.exists(self.history_path):
+            return []
+        with open(self.history_path) as f:
+            self._history_mtime = os.fstat(f.fileno()).st_mtime_ns
+            return messages_from_dict(json.load(f))
+
+    def _save_history(self):
+        # Written aside and swapped in, so readers never see a partial file
+        os.makedirs(os.path.dirname(self.history_path), exist_ok=True)
+        temp_path = f"{self.history_path}.{uuid.uuid4().hex}.part"
+        try:
+            with open(temp_path, "w") as f:
+                json.dump(messages_to_dict(self.chat_history), f)
+            os.replace(temp_path, self.history_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        self._history_mtime = os.stat(self.history_path).st_mtime_ns
@@ -0,0 +1,201 @@
+import os
+import sys
+import json
+import heapq
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from pydantic import ConfigDict
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from logger.custom_logger import CustomLogger
+from exception.custom_exception_archive import DocumentPortalException
+from model.models import SearchFilters
+from utils.config_loader import load_config
+from utils.path_utils import path_under
+from src.document_ingestion.index_store import SessionIndex, HEADER_FILE
+
+
+class ShardedSearch:
+    """
+    Searches all session indexes of a tenant as shards of one corpus.
+    Shards are pre-filtered on their header (session, mode, date) and
+    rows on their chunk metadata (file type, source) before any vector is
+    scored; the surviving shards are searched in parallel and merged into
+    a global top-k. With `layer` set, each shard is the named sub-index of
+    a session (e.g. its "summaries") instead of the chunk index itself.
+    """
+
+    def __init__(self, tenant_id: str = "default", index_dir: str = None,
+                 max_workers: int = None, layer: str = None):
+        self.log = CustomLogger().get_logger(__name__)
+        try:
+            self.config = load_config()
+            self.tenant_id = tenant_id
+            self.root = path_under(
+                index_dir or self.config["faiss_db"].get("index_dir", "faiss_index"),
+                tenant_id)
+            self.layer = layer
+            self.top_k = int(self.config["retriever"]["top_k"])
+            self.executor = ThreadPoolExecutor(
+                max_workers=max_workers or min(32, (os.cpu_count() or 1) + 4),
+                thread_name_prefix="shard-search")
+            self._shards = {}   # path -> (header mtime, SessionIndex)
+            self._headers = {}  # path -> (header mtime, header), for pre-filtering
+            self._lock = threading.Lock()
+            self.log.info("ShardedSearch initialized", tenant_id=tenant_id,
+                          root=self.root)
+        except Exception as e:
+            self.log.error("Error initializing ShardedSearch", error=str(e))
+            raise DocumentPortalException("Error initializing ShardedSearch", sys) from e
+
+    def shards(self, filters: SearchFilters = None) -> list[SessionIndex]:
+        """
+        Open the session indexes under the tenant root that match the
+        header filters, reusing already loaded ones unless their header
+        changed on disk. Sessions are skipped by directory name and then
+        by header before any index is opened.
+        """
+        if not os.path.isdir(self.root):
+            return []
+        filters = filters or SearchFilters()
+        found = {}
+        for entry in os.scandir(self.root):
+            if not entry.is_dir():
+                continue
+            # Session directories are named after their session id
+            if filters.session_ids and entry.name not in filters.session_ids:
+                continue
+            path = os.path.join(entry.path, self.layer) if self.layer else entry.path
+            try:
+                found[path] = os.stat(os.path.join(path, HEADER_FILE)).st_mtime_ns
+            except FileNotFoundError:
+                continue
+
+        with self._lock:
+            for cache in (self._shards, self._headers):
+                for path in list(cache):
+                    changed = cache[path][0] != found[path] if path in found else \
+                        not os.path.exists(os.path.join(path, HEADER_FILE))
+                    if changed:
+                        stale = cache.pop(path)
+                        if cache is self._shards:
+                            stale[1].close()
+            selected = []
+            for path, mtime in found.items():
+                if path in self._shards:
+                    header = self._shards[path][1].header
+                else:
+                    if path not in self._headers:
+                        self._headers[path] = (mtime, self._read_header(path))
+                    header = self._headers[path][1]
+                if header is None or not self._shard_matches(header, filters):
+                    continue
+                if path not in self._shards:
+                    self._shards[path] = (mtime, SessionIndex(path))
+                    self._headers.pop(path, None)
+                selected.append(self._shards[path][1])
+            return selected
+
+    def _read_header(self, path: str):
+        try:
+            with open(os.path.join(path, HEADER_FILE)) as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            self.log.warning("Skipping unreadable shard header", path=path, error=str(e))
+            return None
+
+    def search(self, query_vector, k: int = None,
+               filters: SearchFilters = None) -> list[tuple[Document, float]]:
+        """
+        Return the global top-k (document, score) pairs across all shards.
+        """
+        return [(doc, score) for doc, score, _ in
+                self.search_with_vectors(query_vector, k, filters)]
+
+    def search_with_vectors(self, query_vector, k: int = None,
+                            filters: SearchFilters = None) -> list[tuple[Document, float, np.ndarray]]:
+        """
+        Like `search`, but also return each hit's stored unit vector so
+        later stages can compare chunks without re-embedding them.
+        """
+        try:
+            k = k or self.top_k
+            filters = filters or SearchFilters()
+            selected = self.shards(filters)
+            if not selected:
+                return []
+
+            futures = [self.executor.submit(self._search_shard, index, query_vector, k, filters)
+                       for index in selected]
+            candidates = [hit for future in futures for hit in future.result()]
+            best = heapq.nlargest(k, candidates, key=lambda hit: hit[2])
+
+            # Chunk text is read only for the winners, grouped per shard
+            by_shard = {}
+            for index, row_id, _ in best:
+                by_shard.setdefault(id(index), (index, []))[1].append(row_id)
+            texts, vectors = {}, {}
+            for index, row_ids in by_shard.values():
+                for row_id, chunk in index.fetch(row_ids).items():
+                    texts[(id(index), row_id)] = chunk
+                for row_id, vector in zip(row_ids, index.get_vectors(row_ids)):
+                    vectors[(id(index), row_id)] = vector
+
+            results = []
+            for index, row_id, score in best:
+                text, metadata = texts[(id(index), row_id)]
+                results.append((Document(page_content=text, metadata={
+                    **metadata,
+                    "row_id": row_id,
+                    "session_id": index.header.get("session_id"),
+                    "mode": index.header.get("mode"),
+                    "score": score,
+                }), score, vectors[(id(index), row_id)]))
+
+            self.log.info("Sharded search completed", tenant_id=self.tenant_id,
+                          shards=len(selected), candidates=len(candidates),
+                          returned=len(results))
+            return results
+        except Exception as e:
+            self.log.error("Sharded search failed", error=str(e),
+                           tenant_id=self.tenant_id)
+            raise DocumentPortalException("Sharded search failed", sys) from e
+
+    @staticmethod
+    def _search_shard(index: SessionIndex, query_vector, k: int, filters: SearchFilters):
+        row_ids = index.filter_rows(filters.file_types, filters.sources)
+        return [(index, row_id, score)
+                for row_id, score in index.search(query_vector, k, row_ids=row_ids)]
+
+    @staticmethod
+    def _shard_matches(header: dict, filters: SearchFilters) -> bool:
+        if filters.session_ids and header.get("session_id") not in filters.session_ids:
+            return False
+        if filters.modes and header.get("mode") not in filters.modes:
+            return False
+        created_at = header.get("created_at", "")
+        if filters.created_after and created_at < filters.created_after:
+            return False
+        if filters.created_before and created_at > filters.created_before:
+            return False
+        return True
+
+
+class ShardedRetriever(BaseRetriever):
+    """
+    LangChain retriever over a tenant's whole corpus.
+    """
+
+    search: ShardedSearch
+    embeddings: object
+    filters: SearchFilters = SearchFilters()
+    k: int = None
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    def _get_relevant_documents(self, query: str, *,
+                                run_manager: CallbackManagerForRetrieverRun) -> list[Document]:
+        query_vector = self.embeddings.embed_query(query)
+        return [doc for doc, _ in self.search.search(query_vector, self.k, self.filters)]
@@ -2,6 +2,7 @@ import sys
 from dotenv import load_dotenv
 import pandas as pd
 from logger.custom_logger import CustomLogger
+from logger.tracing import span
 from exception.custom_exception_archive import DocumentPortalException
 from model.models import SummaryResponse, PromptType
 from prompt.prompt_library import PROMPT_REGISTRY
@@ -28,7 +29,7 @@ class DocumentComparatorLLM:
         self.fixing_parser = OutputFixingParser.from_llm(
             parser=self.parser, llm=self.llm)
         self.prompt = PROMPT_REGISTRY[PromptType.DOCMENT_COMPARISON.value]
-        self.chain = self.prompt | self.llm | self.parser
+        self.chain = self.prompt | self.llm
         self.log.info(
             "DocumentComparatorLLM initialized.", model=self.llm)
 
@@ -42,7 +43,10 @@ class DocumentComparatorLLM:
                 "format_instructions": self.parser.get_format_instructions()
             }
             self.log.info("Invoking document comparison LLM chain")
-            response = self.chain.invoke(inputs)
+            with span("comparator.llm", input_chars=len(combined_docs)):
+                message = self.chain.invoke(inputs)
+            with span("comparator.parse"):
+                response = self.parser.invoke(message)
             self.log.info("Chain invoked successfully",
                           response_preview=str(response)[:200])
             return self._format_response(response)
@@ -0,0 +1,169 @@
+import os
+import re
+import json
+import zlib
+import sqlite3
+import hashlib
+import threading
+from pathlib import Path
+from datetime import datetime, timezone
+from functools import lru_cache
+import fitz
+import docx
+from logger.custom_logger import CustomLogger
+from logger.tracing import span
+from utils.config_loader import load_config
+
+# Bump when extract_document changes what it returns, so stale entries are ignored
+EXTRACTOR_VERSION = 1
+ARTIFACT_DOCUMENT = "document"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS artifacts (
+    content_hash  TEXT NOT NULL,
+    kind          TEXT NOT NULL,
+    version       TEXT NOT NULL,
+    data          BLOB NOT NULL,
+    created_at    TEXT NOT NULL,
+    PRIMARY KEY (content_hash, kind, version)
+);
+"""
+
+# (path, size, mtime) -> content hash, so one file is hashed once per process
+_hash_memo = {}
+_hash_lock = threading.Lock()
+
+
+def file_content_hash(file_path: str, chunk_size: int = 1024 * 1024) -> str:
+    """
+    SHA-256 of a saved file, read in chunks.
+    """
+    stat = os.stat(file_path)
+    key = (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns)
+    with _hash_lock:
+        if key in _hash_memo:
+            return _hash_memo[key]
+    hasher = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            hasher.update(block)
+    digest = hasher.hexdigest()
+    with _hash_lock:
+        if len(_hash_memo) > 4096:
+            _hash_memo.clear()
+        _hash_memo[key] = digest
+    return digest
+
+
+def extract_document(file_path: str) -> dict:
+    """
+    Parse a saved file once into everything later stages derive from it:
+    per-page text, page count and raw document properties.
+    """
+    extension = Path(file_path).suffix.lower()
+    with span("extract.parse", file_type=extension):
+        if extension == ".pdf":
+            with fitz.open(file_path) as doc:
+                return {
+                    "pages": [page.get_text() for page in doc],
+                    "page_count": doc.page_count,
+                    "properties": {**(doc.metadata or {}), "xmp": doc.get_xml_metadata()},
+                }
+        if extension == ".docx":
+            document = docx.Document(file_path)
+            props = document.core_properties
+            # Page count lives in docProps/app.xml and is only as fresh as the last save in Word
+            pages = None
+            app_props = next((rel.target_part for rel in document.part.package.rels.values()
+                              if rel.reltype.endswith("/extended-properties")), None)
+            if app_props is not None:
+                match = re.search(rb"<Pages>(\d+)</Pages>", app_props.blob)
+                if match:
+                    pages = int(match.group(1))
+            return {
+                "pages": ["\n".join(p.text for p in document.paragraphs)],
+                "page_count": pages,
+                "properties": {
+                    "title": props.title,
+                    "author": props.author,
+                    "created": props.created.date().isoformat() if props.created else None,
+                    "modified": props.modified.date().isoformat() if props.modified else None,
+                },
+            }
+        if extension == ".txt":
+            return {
+                "pages": [Path(file_path).read_text(encoding="utf-8", errors="ignore")],
+                "page_count": None,
+                "properties": {},
+            }
+    raise ValueError(f"Unsupported file type: {extension}")
+
+
+class ArtifactCache:
+    """
+    On-disk cache of artifacts derived from uploaded files (extracted pages,
+    properties, chunk lists), keyed by file content hash, artifact kind and
+    the version of the code that produced it. Values are zlib-compressed
+    JSON in SQLite, so identical bytes are parsed once for analysis,
+    comparison and both chat modes, across sessions and processes.
+    """
+
+    def __init__(self, db_path: str = "artifact_cache/artifacts.sqlite"):
+        self.log = CustomLogger().get_logger(__name__)
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        self.log.info("ArtifactCache initialized", db_path=db_path)
+
+    def get(self, content_hash: str, kind: str, version):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data FROM artifacts WHERE content_hash = ? AND kind = ? AND version = ?",
+                (content_hash, kind, str(version))).fetchone()
+        return json.loads(zlib.decompress(row[0])) if row else None
+
+    def put(self, content_hash: str, kind: str, version, value):
+        data = zlib.compress(json.dumps(value, separators=(",", ":")).encode("utf-8"), 6)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO artifacts (content_hash, kind, version, data, created_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (content_hash, kind, str(version), data,
+                 datetime.now(timezone.utc).isoformat()))
+
+    def document(self, file_path: str, content_hash: str = None) -> dict:
+        """
+        extract_document(file_path), served from the cache when these bytes
+        were already parsed.
+        """
+        content_hash = content_hash or file_content_hash(file_path)
+        artifact = self.get(content_hash, ARTIFACT_DOCUMENT, EXTRACTOR_VERSION)
+        if artifact is not None:
+            self.log.info("Artifact cache hit", kind=ARTIFACT_DOCUMENT, file_path=file_path)
+            return artifact
+        artifact = extract_document(file_path)
+        self.put(content_hash, ARTIFACT_DOCUMENT, EXTRACTOR_VERSION, artifact)
+        return artifact
+
+
+@lru_cache(maxsize=1)
+def get_artifact_cache():
+    """
+    The process-wide ArtifactCache, or None when disabled in config.
+    """
+    cache_config = load_config().get("artifact_cache", {})
+    if not cache_config.get("enabled", True):
+        return None
+    return ArtifactCache(cache_config.get("db_path", "artifact_cache/artifacts.sqlite"))
+
+
+def load_document_artifact(file_path: str, content_hash: str = None) -> dict:
+    """
+    Pages, page count and properties of a saved file, cached when enabled.
+    Pass `content_hash` when it is already known to skip re-hashing the file.
+    """
+    cache = get_artifact_cache()
+    return cache.document(file_path, content_hash) if cache else extract_document(file_path)
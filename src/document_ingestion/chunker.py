@@ -0,0 +1,318 @@
+import re
+import hashlib
+from collections import Counter, defaultdict
+import numpy as np
+from langchain_core.documents import Document
+from logger.custom_logger import CustomLogger
+from utils.LLm_utils import count_tokens, split_sentences, split_to_token_limit, tokenizer_name
+from src.document_ingestion.artifact_cache import EXTRACTOR_VERSION
+
+# Numbered ("3.2 Scaled Dot-Product Attention"), or short title/upper-case lines
+_NUMBERED_HEADING = re.compile(r"^(\d+(\.\d+)*|[IVX]+\.|[A-Z]\.)\s+[A-Z][^.!?]{1,80}$")
+_CAPS_HEADING = re.compile(r"^[A-Z][A-Z0-9,:&\-]*( [A-Z0-9,:&\-]+)+$")
+_SECTION_NUMBER = re.compile(r"^(\d+(\.\d+)*|[IVX]+\.|[A-Z]\.)$")
+_TITLE_LINE = re.compile(r"^[A-Z][^.!?]{1,80}$")
+_WORDY = re.compile(r"[A-Za-z].*[A-Za-z].*[A-Za-z]")
+_DIGITS = re.compile(r"\d+")
+# Only this many lines at each end of a page are header/footer candidates
+EDGE_LINES = 3
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+# Bump when chunk boundaries change, so cached chunk lists are rebuilt
+CHUNKER_VERSION = 3
+ARTIFACT_CHUNKS = "chunks"
+
+
+class StructureAwareChunker:
+    """
+    Splits documents into token-bounded chunks along their structure
+    (pages, headings, paragraphs) and drops near-duplicate chunks such as
+    repeated headers, footers and disclaimers, so they are embedded once.
+    """
+
+    def __init__(self, chunk_tokens: int = 400, overlap_tokens: int = 40,
+                 num_permutations: int = 64, bands: int = 16,
+                 duplicate_threshold: float = 0.85, shingle_size: int = 5,
+                 cache=None):
+        self.log = CustomLogger().get_logger(__name__)
+        if num_permutations % bands:
+            raise ValueError("num_permutations must be divisible by bands")
+        self.chunk_tokens = chunk_tokens
+        self.overlap_tokens = overlap_tokens
+        self.bands = bands
+        self.duplicate_threshold = duplicate_threshold
+        self.shingle_size = shingle_size
+        # Optional ArtifactCache holding per-document chunk lists
+        self.cache = cache
+
+        rng = np.random.default_rng(1)
+        self._perm_a = rng.integers(1, 1 << 32, num_permutations, dtype=np.uint64)
+        self._perm_b = rng.integers(0, 1 << 32, num_permutations, dtype=np.uint64)
+
+    @classmethod
+    def from_config(cls, config: dict, cache=None) -> "StructureAwareChunker":
+        chunking = config.get("chunking", {})
+        return cls(
+            chunk_tokens=int(chunking.get("chunk_tokens", 400)),
+            overlap_tokens=int(chunking.get("overlap_tokens", 40)),
+            num_permutations=int(chunking.get("minhash_permutations", 64)),
+            bands=int(chunking.get("minhash_bands", 16)),
+            duplicate_threshold=float(chunking.get("duplicate_threshold", 0.85)),
+            shingle_size=int(chunking.get("shingle_size", 5)),
+            cache=cache,
+        )
+
+    def split_documents(self, documents: list[Document],
+                        content_hashes: dict[str, str] = None) -> list[Document]:
+        """
+        Chunk page-level documents and return the deduplicated chunks.
+        Each chunk carries source, page, heading and character offsets
+        within its source document. With a cache, `content_hashes` (source
+        name -> content hash) lets identical files reuse their chunk list.
+        """
+        chunks = [chunk for source_chunks in
+                  self.chunk_documents(documents, content_hashes).values()
+                  for chunk in source_chunks]
+        unique = self.deduplicate(chunks)
+
+        self.log.info("Documents chunked", pages=len(documents),
+                      chunks=len(chunks), unique_chunks=len(unique))
+        return unique
+
+    def chunk_documents(self, documents: list[Document],
+                        content_hashes: dict[str, str] = None) -> dict[str, list[Document]]:
+        """
+        Chunk page-level documents per source, before deduplication across
+        sources. Each list depends only on its own document.
+        """
+        by_source = defaultdict(list)
+        for doc in documents:
+            by_source[doc.metadata.get("source")].append(doc)
+        return {source: self._cached_chunks(source, source_docs,
+                                            (content_hashes or {}).get(source))
+                for source, source_docs in by_source.items()}
+
+    def _cached_chunks(self, source: str, pages: list[Document], content_hash: str):
+        if self.cache is None or not content_hash:
+            return self._chunk_source(pages)
+        # Chunks derive from extracted pages, so a new extractor invalidates them too
+        version = (f"{CHUNKER_VERSION}:{EXTRACTOR_VERSION}:{self.chunk_tokens}:"
+                   f"{self.overlap_tokens}:{tokenizer_name()}")
+        cached = self.cache.get(content_hash, ARTIFACT_CHUNKS, version)
+        if cached is not None:
+            # The same bytes may have been uploaded under another name
+            return [Document(page_content=text, metadata={**metadata, "source": source})
+                    for text, metadata in cached]
+        chunks = self._chunk_source(pages)
+        self.cache.put(content_hash, ARTIFACT_CHUNKS, version,
+                       [[chunk.page_content, chunk.metadata] for chunk in chunks])
+        return chunks
+
+    def _chunk_source(self, pages: list[Document]) -> list[Document]:
+        pages = sorted(pages, key=lambda d: d.metadata.get("page", 0))
+        boilerplate = self._repeated_lines(pages)
+
+        chunks = []
+        offset = 0
+        heading = None
+        for page in pages:
+            units, heading = self._page_units(page.page_content, boilerplate, heading)
+            chunks.extend(self._pack(units, page.metadata, offset))
+            offset += len(page.page_content) + 1
+
+        if boilerplate:
+            # Repeated header/footer lines are kept once per source document
+            first = pages[0].metadata
+            text = "\n".join(boilerplate[key] for key in sorted(boilerplate))
+            for piece in split_to_token_limit(text, self.chunk_tokens):
+                chunks.append(Document(
+                    page_content=piece,
+                    metadata={**first, "heading": None, "boilerplate": True,
+                              "start_index": -1, "end_index": -1,
+                              "token_count": count_tokens(piece)}))
+        return chunks
+
+    def _repeated_lines(self, pages: list[Document]) -> dict[str, str]:
+        """
+        Lines at the top or bottom of most pages (page numbers normalised)
+        are headers or footers. Maps each normalised line to its first
+        original occurrence, which is what the boilerplate chunk keeps.
+        """
+        if len(pages) < 3:
+            return {}
+        seen = Counter()
+        originals = {}
+        for page in pages:
+            lines = [line.strip() for line in page.page_content.splitlines() if line.strip()]
+            edges = {_DIGITS.sub("0", line): line
+                     for line in reversed(lines[:EDGE_LINES] + lines[-EDGE_LINES:])}
+            seen.update(edges.keys())
+            for key, line in edges.items():
+                originals.setdefault(key, line)
+        return {key: originals[key] for key, n in seen.items()
+                if n >= max(3, len(pages) // 2) and _WORDY.search(key)}
+
+    def _page_units(self, text: str, boilerplate: dict[str, str], heading):
+        """
+        Break a page into (text, start, end, heading, is_heading) units:
+        headings, paragraphs, or sentences of oversize paragraphs.
+        """
+        units = []
+        paragraph, para_start = [], None
+        section_number = None
+        position = 0
+
+        def flush(end):
+            nonlocal paragraph, para_start
+            if paragraph:
+                units.extend(self._split_paragraph(" ".join(paragraph), para_start, end, heading))
+            paragraph, para_start = [], None
+
+        for line in text.splitlines(keepends=True):
+            start, position = position, position + len(line)
+            stripped = line.strip()
+            if not stripped:
+                flush(start)
+            elif _DIGITS.sub("0", stripped) in boilerplate:
+                continue
+            elif _SECTION_NUMBER.match(stripped):
+                # PDF text often puts "3.2" and its title on separate lines
+                section_number = (stripped, start)
+                continue
+            elif self._is_heading(stripped) or (section_number and _TITLE_LINE.match(stripped)):
+                flush(start)
+                if section_number:
+                    stripped, start = f"{section_number[0]} {stripped}", section_number[1]
+                heading = stripped
+                units.append((stripped, start, position, heading, True))
+            else:
+                if section_number:
+                    # A lone number that was not followed by a title is content
+                    stripped, start = f"{section_number[0]} {stripped}", section_number[1]
+                if para_start is None:
+                    para_start = start
+                paragraph.append(stripped)
+            if not _SECTION_NUMBER.match(line.strip()):
+                section_number = None
+        flush(position)
+        return units, heading
+
+    def _split_paragraph(self, paragraph: str, start: int, end: int, heading):
+        """
+        Units of at most `chunk_tokens` tokens: the paragraph, else its
+        sentences, with sentences still too long (or text without sentence
+        boundaries) cut between words.
+        """
+        if count_tokens(paragraph) <= self.chunk_tokens:
+            return [(paragraph, start, end, heading, False)]
+        # Offsets are approximate once line breaks are collapsed
+        units, cursor = [], start
+        for sentence in split_sentences(paragraph):
+            pieces = [sentence] if count_tokens(sentence) <= self.chunk_tokens else \
+                split_to_token_limit(sentence, self.chunk_tokens)
+            for piece in pieces:
+                units.append((piece, cursor, min(cursor + len(piece), end), heading, False))
+                cursor = min(cursor + len(piece) + 1, end)
+        return units
+
+    @staticmethod
+    def _is_heading(line: str) -> bool:
+        if len(line) > 80 or line.endswith((".", ",", ";")):
+            return False
+        return bool(_NUMBERED_HEADING.match(line) or _CAPS_HEADING.match(line))
+
+    def _pack(self, units, page_metadata: dict, page_offset: int) -> list[Document]:
+        """
+        Greedily pack units into chunks of at most `chunk_tokens` tokens;
+        no unit is larger than that, so no chunk is either.
+        A heading always starts a new chunk; size-driven splits carry a short
+        tail of the previous chunk as overlap.
+        """
+        chunks = []
+        current, tokens = [], 0
+
+        def fits(candidate, estimate) -> bool:
+            # Per-unit counts leave out the "\n" joins and do not add up exactly,
+            # so the joined text is counted once the estimate nears the budget
+            if estimate + 2 * len(candidate) <= self.chunk_tokens:
+                return True
+            return count_tokens("\n".join(u[0] for u in candidate)) <= self.chunk_tokens
+
+        def emit():
+            if not current or all(is_heading for *_, is_heading in current):
+                return
+            text = "\n".join(u[0] for u in current)
+            chunks.append(Document(page_content=text, metadata={
+                **page_metadata,
+                "heading": current[-1][3],
+                "start_index": page_offset + current[0][1],
+                "end_index": page_offset + current[-1][2],
+                "token_count": count_tokens(text),
+            }))
+
+        for unit in units:
+            unit_tokens = count_tokens(unit[0])
+            is_heading = unit[4]
+            if is_heading and current:
+                emit()
+                current, tokens = [], 0
+            elif current and not fits(current + [unit], tokens + unit_tokens):
+                emit()
+                overlap, overlap_tokens = [], 0
+                for previous in reversed(current):
+                    cost = count_tokens(previous[0])
+                    if previous[4] or overlap_tokens + cost > self.overlap_tokens:
+                        break
+                    overlap.insert(0, previous)
+                    overlap_tokens += cost
+                if overlap and not fits(overlap + [unit], overlap_tokens + unit_tokens):
+                    overlap, overlap_tokens = [], 0
+                current, tokens = overlap, overlap_tokens
+            current.append(unit)
+            tokens += unit_tokens
+        emit()
+        return chunks
+
+    def minhash(self, text: str) -> np.ndarray:
+        """
+        MinHash signature over word shingles, with digits normalised so that
+        page numbers and dates do not break otherwise identical boilerplate.
+        """
+        words = _DIGITS.sub("0", text.lower()).split()
+        size = min(self.shingle_size, max(len(words), 1))
+        shingles = {" ".join(words[i:i + size])
+                    for i in range(max(len(words) - size + 1, 1))}
+        hashes = np.fromiter(
+            (int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "little")
+             for s in shingles), dtype=np.uint64, count=len(shingles))
+        permuted = (np.outer(hashes, self._perm_a) + self._perm_b) % _MERSENNE_PRIME
+        return permuted.min(axis=0)
+
+    def deduplicate(self, chunks: list[Document]) -> list[Document]:
+        """
+        Drop chunks whose MinHash similarity to an earlier chunk reaches the
+        threshold; LSH banding keeps this close to linear. The kept chunk
+        records where its duplicates came from.
+        """
+        rows = len(self._perm_a) // self.bands
+        buckets = defaultdict(list)
+        signatures = []
+        unique = []
+        for chunk in chunks:
+            signature = self.minhash(chunk.page_content)
+            keys = [(band, signature[band * rows:(band + 1) * rows].tobytes())
+                    for band in range(self.bands)]
+            candidates = {i for key in keys for i in buckets.get(key, ())}
+            original = next((i for i in sorted(candidates)
+                             if np.mean(signatures[i] == signature) >= self.duplicate_threshold),
+                            None)
+            if original is not None:
+                kept = unique[original].metadata
+                kept.setdefault("duplicates", []).append(
+                    {"source": chunk.metadata.get("source"),
+                     "page": chunk.metadata.get("page")})
+                continue
+            for key in keys:
+                buckets[key].append(len(unique))
+            signatures.append(signature)
+            unique.append(chunk)
+        return unique
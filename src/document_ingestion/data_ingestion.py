@@ -0,0 +1,383 @@
+import os
+import sys
+import uuid
+import hashlib
+from pathlib import Path
+from datetime import datetime
+from langchain_core.documents import Document
+from logger.custom_logger import CustomLogger
+from logger.tracing import span, traced
+from exception.custom_exception_archive import DocumentPortalException
+from model.models import SavedDocument
+from utils.config_loader import load_config
+from utils.model_loader import ModelLoader
+from utils.path_utils import path_under
+from src.document_ingestion.chunker import StructureAwareChunker
+from src.document_ingestion.artifact_cache import (
+    file_content_hash, get_artifact_cache, load_document_artifact)
+from src.document_ingestion.summary_index import SummaryIndexBuilder
+from src.document_ingestion.index_store import (
+    SessionIndexWriter, SessionIndex, SessionIndexRetriever)
+
+# Leading bytes used to sniff the real file type while the upload streams in
+FILE_SIGNATURES = {
+    b"%PDF-": ".pdf",
+    b"PK\x03\x04": ".docx",  # docx is a zip container
+}
+SUPPORTED_EXTENSIONS = {".pdf", ".docx", ".txt"}
+SNIFF_BYTES = 8
+
+
+class DocumentHandler:
+    """
+    Handles saving and reading of uploaded documents for a session.
+    Uploads are streamed to disk in fixed-size chunks, hashing and sniffing
+    the file type on the way, so a full in-memory copy is never made.
+    """
+
+    def __init__(self, data_dir=None, session_id=None):
+        self.log = CustomLogger().get_logger(__name__)
+        try:
+            ingestion_config = load_config().get("ingestion", {})
+            self.chunk_size = int(
+                ingestion_config.get("chunk_size_bytes", 1024 * 1024))
+            self.max_file_size = int(
+                ingestion_config.get("max_file_size_mb", 50)) * 1024 * 1024
+
+            self.data_dir = data_dir or os.getenv(
+                "DATA_STORAGE_PATH",
+                os.path.join(os.getcwd(), "data", "document_analysis"))
+            self.session_id = session_id or \
+                f"session_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+            # session_id may come from a client; it must name a directory under data_dir
+            self.session_path = path_under(self.data_dir, self.session_id)
+            os.makedirs(self.session_path, exist_ok=True)
+
+            self.log.info("DocumentHandler initialized",
+                          session_id=self.session_id,
+                          session_path=self.session_path)
+
+        except Exception as e:
+            self.log.error(f"Error initializing DocumentHandler: {e}")
+            raise DocumentPortalException(
+                "Error initializing DocumentHandler", sys) from e
+
+    def save_file(self, uploaded_file, allowed_extensions=None) -> SavedDocument:
+        """
+        Stream an uploaded file into the session directory.
+        The content hash is computed and the file type sniffed while writing;
+        oversized or mismatched files are rejected before they are fully read.
+        """
+        temp_path = None
+        try:
+            # FastAPI uploads expose `filename`, streamlit and open() files `name`
+            file_name = Path(getattr(uploaded_file, "filename", None)
+                             or uploaded_file.name).name
+            extension = Path(file_name).suffix.lower()
+            if extension not in (allowed_extensions or SUPPORTED_EXTENSIONS):
+                raise ValueError(f"Unsupported file type: {extension}")
+
+            declared_size = self._declared_size(uploaded_file)
+            if declared_size is not None and declared_size > self.max_file_size:
+                raise ValueError(
+                    f"File too large: {declared_size} bytes (limit {self.max_file_size})")
+
+            # Unique temporary name: concurrent uploads never share a .part file
+            temp_path = os.path.join(self.session_path, f".{uuid.uuid4().hex}.part")
+            hasher = hashlib.sha256()
+            head = b""
+            size = 0
+
+            with open(temp_path, "wb") as out:
+                for chunk in self._iter_chunks(uploaded_file):
+                    size += len(chunk)
+                    if size > self.max_file_size:
+                        raise ValueError(
+                            f"File too large: exceeded {self.max_file_size} bytes")
+                    if len(head) < SNIFF_BYTES:
+                        head += bytes(chunk[:SNIFF_BYTES - len(head)])
+                        if len(head) >= SNIFF_BYTES:
+                            self._check_file_type(head, extension)
+                    hasher.update(chunk)
+                    out.write(chunk)
+
+            if len(head) < SNIFF_BYTES:
+                self._check_file_type(head, extension)
+            save_path = self._publish(temp_path, file_name)
+            file_name = os.path.basename(save_path)
+
+            saved = SavedDocument(
+                file_name=file_name,
+                file_path=save_path,
+                file_type=extension,
+                content_hash=hasher.hexdigest(),
+                size_bytes=size,
+            )
+            self.log.info("File saved successfully", file=file_name,
+                          size_bytes=size, content_hash=saved.content_hash,
+                          session_id=self.session_id)
+            return saved
+
+        except Exception as e:
+            self.log.error("Error saving file", error=str(e),
+                           session_id=self.session_id)
+            raise DocumentPortalException("Error saving file", sys) from e
+        finally:
+            if temp_path and os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def _publish(self, temp_path: str, file_name: str) -> str:
+        """
+        Give a finished upload its final name without replacing an existing
+        file: same-named uploads become "name_1.ext", "name_2.ext", ...
+        Hard-linking fails atomically if the name is taken, even when
+        several requests write into the same session at once.
+        """
+        stem, extension = Path(file_name).stem, Path(file_name).suffix
+        for attempt in range(1000):
+            candidate = file_name if attempt == 0 else f"{stem}_{attempt}{extension}"
+            save_path = os.path.join(self.session_path, candidate)
+            try:
+                os.link(temp_path, save_path)
+                return save_path
+            except FileExistsError:
+                continue
+        raise ValueError(f"Too many files named {file_name} in session")
+
+    def session_files(self) -> list[str]:
+        """
+        Paths of every saved document in the session, in name order.
+        Skips in-progress ".part" uploads.
+        """
+        return sorted(
+            entry.path for entry in os.scandir(self.session_path)
+            if entry.is_file() and not entry.name.startswith(".")
+            and Path(entry.name).suffix.lower() in SUPPORTED_EXTENSIONS)
+
+    def save_pdf(self, uploaded_file) -> str:
+        """
+        Save an uploaded PDF and return its path on disk.
+        """
+        return self.save_file(uploaded_file, allowed_extensions={".pdf"}).file_path
+
+    def read_pdf(self, pdf_path: str) -> str:
+        """
+        Read text from a saved PDF, page by page.
+        Pages come from the shared artifact cache, so a PDF already parsed
+        for analysis or chat is not parsed again.
+        """
+        try:
+            text_chunks = []
+            with span("extract.text", file_type=".pdf"):
+                pages = load_document_artifact(pdf_path)["pages"]
+            for page_num, page_text in enumerate(pages):
+                text_chunks.append(
+                    f"\n--- Page {page_num + 1} ---\n{page_text}")
+            text = "\n".join(text_chunks)
+            self.log.info("PDF read successfully", pdf_path=pdf_path,
+                          session_id=self.session_id, pages=len(text_chunks))
+            return text
+        except Exception as e:
+            self.log.error("Error reading PDF", error=str(e),
+                           pdf_path=pdf_path)
+            raise DocumentPortalException("Error reading PDF", sys) from e
+
+    def combine_documents(self, file_paths: list[str]) -> str:
+        """
+        Combine the text of several PDFs into one labelled string for comparison.
+        """
+        combined = []
+        for file_path in file_paths:
+            combined.append(
+                f"Document: {Path(file_path).name}\n{self.read_pdf(file_path)}")
+        return "\n\n".join(combined)
+
+    def _iter_chunks(self, uploaded_file):
+        """
+        Yield the upload in chunks of at most `chunk_size` bytes.
+        Supports already-buffered uploads (streamlit `getbuffer`), framework
+        uploads exposing `.file` (FastAPI) and plain binary file objects.
+        """
+        if hasattr(uploaded_file, "getbuffer"):
+            # Slicing a memoryview is zero-copy over the existing buffer
+            view = memoryview(uploaded_file.getbuffer())
+            for start in range(0, len(view), self.chunk_size):
+                yield view[start:start + self.chunk_size]
+            return
+
+        stream = getattr(uploaded_file, "file", uploaded_file)
+        if not hasattr(stream, "read"):
+            raise ValueError("Uploaded object is not readable")
+        while True:
+            chunk = stream.read(self.chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+    @staticmethod
+    def _declared_size(uploaded_file):
+        """
+        Size announced by the upload, if any, so it can be rejected up front.
+        """
+        size = getattr(uploaded_file, "size", None)
+        if isinstance(size, int):
+            return size
+        stream = getattr(uploaded_file, "file", uploaded_file)
+        try:
+            return os.fstat(stream.fileno()).st_size
+        except (AttributeError, OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _check_file_type(head: bytes, extension: str):
+        """
+        Make sure the sniffed content matches the declared extension.
+        """
+        sniffed = next((ext for signature, ext in FILE_SIGNATURES.items()
+                        if head.startswith(signature)), None)
+        if sniffed is None:
+            try:
+                head.decode("utf-8")
+                sniffed = ".txt"
+            except UnicodeDecodeError:
+                # The sniff window may have cut a multi-byte character
+                sniffed = ".txt" if b"\x00" not in head else None
+        if sniffed != extension:
+            raise ValueError(
+                f"File content ({sniffed or 'unknown'}) does not match extension {extension}")
+
+
+class ChatIngestor:
+    """
+    Builds the retrieval index of a chat session from uploaded documents.
+    Indexes live under <index_dir>/<tenant_id>/<session_id>.
+    """
+
+    def __init__(self, tenant_id="default", session_id=None, data_dir=None, index_dir=None):
+        self.log = CustomLogger().get_logger(__name__)
+        try:
+            self.model_loader = ModelLoader()
+            self.config = self.model_loader.config
+            self.tenant_id = tenant_id
+            self.handler = DocumentHandler(
+                data_dir=data_dir or os.path.join(
+                    os.getcwd(), "data", "multi_document_chat"),
+                session_id=session_id)
+            self.session_id = self.handler.session_id
+
+            index_root = index_dir or self.config["faiss_db"].get(
+                "index_dir", "faiss_index")
+            self.index_path = path_under(index_root, self.tenant_id, self.session_id)
+
+            self.log.info("ChatIngestor initialized", tenant_id=self.tenant_id,
+                          session_id=self.session_id, index_path=self.index_path)
+        except Exception as e:
+            self.log.error("Error initializing ChatIngestor", error=str(e))
+            raise DocumentPortalException(
+                "Error initializing ChatIngestor", sys) from e
+
+    def ingest_files(self, uploaded_files):
+        """
+        Save the uploaded files, index them and return a retriever.
+        """
+        saved = [self.handler.save_file(f) for f in uploaded_files]
+        index = self.rebuild_index({s.file_name: s.content_hash for s in saved})
+        return SessionIndexRetriever(
+            index=index, embeddings=self.model_loader.load_embeddings(),
+            k=self.config["retriever"]["top_k"])
+
+    def rebuild_index(self, content_hashes: dict[str, str] = None) -> SessionIndex:
+        """
+        Index every document saved in the session so far. Adding files to
+        a session goes through here, since the index is replaced as a whole.
+        """
+        return self.build_index(self.handler.session_files(), content_hashes)
+
+    def build_index(self, file_paths: list[str],
+                    content_hashes: dict[str, str] = None) -> SessionIndex:
+        """
+        Load, split and embed the given files and persist the session index
+        in the native (pickle-free) format. `content_hashes` (file name ->
+        hash, as computed on upload) saves re-reading those files to hash them.
+        """
+        try:
+            known = content_hashes or {}
+            content_hashes = {Path(p).name: known.get(Path(p).name) or file_content_hash(p)
+                              for p in file_paths}
+            documents = load_documents(file_paths, content_hashes)
+            if not documents:
+                raise ValueError("No valid documents to index")
+
+            with span("ingest.chunk", pages=len(documents)):
+                chunker = StructureAwareChunker.from_config(
+                    self.config, cache=get_artifact_cache())
+                document_chunks = chunker.chunk_documents(documents, content_hashes)
+                chunks = chunker.deduplicate(
+                    [chunk for source_chunks in document_chunks.values()
+                     for chunk in source_chunks])
+
+            embeddings = self.model_loader.load_embeddings()
+            texts = [chunk.page_content for chunk in chunks]
+            with span("ingest.embed", chunks=len(texts)):
+                vectors = embeddings.embed_documents(texts)
+
+            vector_dtype = self.config["faiss_db"].get("vector_dtype", "float16")
+            header_extra = {
+                "tenant_id": self.tenant_id,
+                "session_id": self.session_id,
+                "mode": Path(self.handler.data_dir).name,
+                "embedding_model": self.config["embedding_model"]["model_name"],
+            }
+            with span("ingest.write_index"):
+                writer = SessionIndexWriter(dtype=vector_dtype)
+                writer.write(self.index_path, texts,
+                             [chunk.metadata for chunk in chunks], vectors,
+                             header_extra=header_extra)
+
+            summary_config = self.config.get("summary_index", {})
+            if summary_config.get("enabled", False):
+                builder = SummaryIndexBuilder(
+                    llm=self.model_loader.load_llm(), embeddings=embeddings,
+                    cache_dir=summary_config.get("cache_dir", "summary_cache"),
+                    section_token_budget=int(summary_config.get("section_token_budget", 1500)),
+                    vector_dtype=vector_dtype)
+                with span("ingest.summaries"):
+                    # Each document is summarized from its own chunks before
+                    # cross-document dedup, so the summary cached under its
+                    # content hash does not depend on the other files
+                    builder.build(
+                        [chunk for source_chunks in document_chunks.values()
+                         for chunk in source_chunks],
+                        content_hashes, self.index_path, header_extra=header_extra)
+
+            self.log.info("Session index built", session_id=self.session_id,
+                          documents=len(documents), chunks=len(chunks),
+                          index_path=self.index_path)
+            return SessionIndex(self.index_path)
+        except Exception as e:
+            self.log.error("Error building session index", error=str(e),
+                           session_id=self.session_id)
+            raise DocumentPortalException(
+                "Error building session index", sys) from e
+
+
+@traced("ingest.load_documents")
+def load_documents(file_paths: list[str], content_hashes: dict[str, str] = None) -> list[Document]:
+    """
+    Load saved files into LangChain documents, one per PDF page
+    (docx and txt are a single page). Pages come from the artifact cache,
+    looked up by `content_hashes` (file name -> hash) when given.
+    """
+    documents = []
+    for file_path in file_paths:
+        extension = Path(file_path).suffix.lower()
+        if extension not in SUPPORTED_EXTENSIONS:
+            continue
+        source = Path(file_path).name
+        artifact = load_document_artifact(file_path, (content_hashes or {}).get(source))
+        for page_num, text in enumerate(artifact["pages"]):
+            documents.append(Document(
+                page_content=text,
+                metadata={"source": source, "file_type": extension,
+                          "page": page_num + 1}))
+    return [d for d in documents if d.page_content.strip()]
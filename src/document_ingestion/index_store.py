@@ -0,0 +1,299 @@
+import os
+import sys
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from datetime import datetime, timezone
+import numpy as np
+from pydantic import ConfigDict
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from logger.custom_logger import CustomLogger
+from exception.custom_exception_archive import DocumentPortalException
+
+# On-disk layout of a session index directory:
+#   header.json            small versioned header (dimensions, dtype, row count,
+#                          session info) naming the current build's files
+#   vectors-<build>.bin    raw row-major unit vectors, memory-mapped on load (or
+#                          the header's vectors_path/vectors_offset, e.g. inside
+#                          a snapshot)
+#   chunks-<build>.sqlite  chunk text and metadata, read only for the rows a
+#                          query returns
+# Every build writes new files and then swaps the header, so rebuilding never
+# touches files an open SessionIndex has mapped. Headers without file names
+# refer to the unversioned vectors.bin / chunks.sqlite.
+INDEX_FORMAT = "document_portal_index"
+INDEX_VERSION = 1
+HEADER_FILE = "header.json"
+VECTORS_FILE = "vectors.bin"
+CHUNKS_FILE = "chunks.sqlite"
+
+# Files of replaced builds are removed once they are this old, leaving time
+# for readers that opened the previous header to finish
+STALE_BUILD_SECONDS = 3600
+
+# Rows scored per block, so float16 vectors are widened a slice at a time
+SEARCH_BLOCK_ROWS = 65536
+
+
+class SessionIndexWriter:
+    """
+    Writes a session index in the native format. No pickling is involved:
+    vectors are raw numbers and chunks are plain SQLite rows.
+    """
+
+    def __init__(self, dtype: str = "float16"):
+        self.log = CustomLogger().get_logger(__name__)
+        self.dtype = np.dtype(dtype)
+
+    def write(self, index_path: str, texts: list[str], metadatas: list[dict],
+              vectors, header_extra: dict = None) -> str:
+        build = f"{time.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        vectors_name = f"vectors-{build}.bin"
+        chunks_name = f"chunks-{build}.sqlite"
+        committed = False
+        try:
+            if len(texts) != len(metadatas) or len(texts) != len(vectors):
+                raise ValueError("texts, metadatas and vectors must have the same length")
+
+            matrix = np.asarray(vectors, dtype=np.float32)
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            matrix = matrix / np.where(norms == 0, 1, norms)
+
+            os.makedirs(index_path, exist_ok=True)
+            previous = current_build_files(index_path)
+            matrix.astype(self.dtype).tofile(os.path.join(index_path, vectors_name))
+
+            chunks_path = os.path.join(index_path, chunks_name)
+            with sqlite3.connect(chunks_path) as conn:
+                conn.execute(
+                    "CREATE TABLE chunks (id INTEGER PRIMARY KEY, text TEXT NOT NULL, "
+                    "source TEXT, file_type TEXT, page INTEGER, metadata TEXT NOT NULL)")
+                conn.executemany(
+                    "INSERT INTO chunks VALUES (?, ?, ?, ?, ?, ?)",
+                    ((i, text, meta.get("source"), meta.get("file_type"),
+                      meta.get("page"), json.dumps(meta, default=str))
+                     for i, (text, meta) in enumerate(zip(texts, metadatas))))
+                conn.execute("CREATE INDEX idx_chunks_source ON chunks (source)")
+                conn.execute("CREATE INDEX idx_chunks_file_type ON chunks (file_type)")
+            conn.close()
+
+            header = {
+                "format": INDEX_FORMAT,
+                "version": INDEX_VERSION,
+                "count": int(matrix.shape[0]),
+                "dim": int(matrix.shape[1]) if matrix.ndim == 2 else 0,
+                "dtype": self.dtype.name,
+                "metric": "cosine",
+                "created_at": datetime.now(timezone.utc).isoformat(),
+                **(header_extra or {}),
+                "vectors_path": vectors_name,
+                "chunks_path": chunks_name,
+            }
+            # Swapping the header in publishes the build: readers see either
+            # the old files or the complete new ones, never a mix
+            header_path = os.path.join(index_path, HEADER_FILE)
+            with open(f"{header_path}.{build}.part", "w") as f:
+                json.dump(header, f, indent=2)
+            os.replace(f"{header_path}.{build}.part", header_path)
+            committed = True
+            removed = remove_stale_builds(index_path, keep=previous | {vectors_name, chunks_name})
+
+            self.log.info("Session index written", index_path=index_path,
+                          count=header["count"], dim=header["dim"],
+                          dtype=header["dtype"], stale_files_removed=removed)
+            return index_path
+        except Exception as e:
+            self.log.error("Error writing session index", error=str(e),
+                           index_path=index_path)
+            raise DocumentPortalException("Error writing session index", sys) from e
+        finally:
+            if not committed:
+                for name in (vectors_name, chunks_name, f"{HEADER_FILE}.{build}.part"):
+                    if os.path.exists(os.path.join(index_path, name)):
+                        os.remove(os.path.join(index_path, name))
+
+
+def current_build_files(index_path: str) -> set[str]:
+    """
+    Names of the vector and chunk files the index header currently points to.
+    """
+    try:
+        with open(os.path.join(index_path, HEADER_FILE)) as f:
+            header = json.load(f)
+    except (OSError, ValueError):
+        return set()
+    return {header.get("vectors_path", VECTORS_FILE), header.get("chunks_path", CHUNKS_FILE)}
+
+
+def remove_stale_builds(index_path: str, keep: set[str]) -> int:
+    """
+    Delete vector and chunk files of earlier builds that are not in `keep`
+    and have outlived STALE_BUILD_SECONDS; returns how many were removed.
+    """
+    cutoff = time.time() - STALE_BUILD_SECONDS
+    removed = 0
+    for entry in os.scandir(index_path):
+        if entry.name in keep or not entry.is_file():
+            continue
+        is_build_file = (entry.name.startswith("vectors") and entry.name.endswith(".bin")) or \
+            (entry.name.startswith("chunks") and entry.name.endswith(".sqlite"))
+        if is_build_file and entry.stat().st_mtime < cutoff:
+            try:
+                os.remove(entry.path)
+                removed += 1
+            except OSError:
+                pass  # still in use on some platforms; the next build retries
+    return removed
+
+
+class SessionIndex:
+    """
+    Lazily loaded session index. Opening it only reads the header and maps
+    the vector file; chunk text is fetched from SQLite for the hits a query
+    actually returns.
+    """
+
+    def __init__(self, index_path: str):
+        self.log = CustomLogger().get_logger(__name__)
+        try:
+            self.index_path = index_path
+            with open(os.path.join(index_path, HEADER_FILE)) as f:
+                self.header = json.load(f)
+            if self.header.get("format") != INDEX_FORMAT:
+                raise ValueError(f"Not a session index: {index_path}")
+            if self.header.get("version", 0) > INDEX_VERSION:
+                raise ValueError(
+                    f"Unsupported index version {self.header['version']}")
+
+            self.count = self.header["count"]
+            self.dim = self.header["dim"]
+            # An imported snapshot's header points into the snapshot file instead
+            vectors_path = os.path.join(
+                index_path, self.header.get("vectors_path", VECTORS_FILE))
+            if self.header.get("snapshot_sha256") and "vectors_offset" in self.header:
+                # Imported inside a function: session_snapshot builds on this module
+                from src.document_ingestion.session_snapshot import snapshot_digest
+                if snapshot_digest(vectors_path) != self.header["snapshot_sha256"]:
+                    raise ValueError(f"Snapshot changed since it was imported: {vectors_path}")
+            self.vectors = np.memmap(
+                vectors_path, dtype=np.dtype(self.header["dtype"]), mode="r",
+                offset=int(self.header.get("vectors_offset", 0)),
+                shape=(self.count, self.dim)) if self.count else \
+                np.zeros((0, self.dim), dtype=np.float32)
+
+            self._local = threading.local()
+        except Exception as e:
+            self.log.error("Error loading session index", error=str(e),
+                           index_path=index_path)
+            raise DocumentPortalException("Error loading session index", sys) from e
+
+    def _conn(self) -> sqlite3.Connection:
+        # One read-only connection per thread, opened on first use
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            chunks_path = os.path.join(
+                self.index_path, self.header.get("chunks_path", CHUNKS_FILE))
+            uri = f"file:{chunks_path}?mode=ro"
+            conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            self._local.conn = conn
+        return conn
+
+    def search(self, query_vector, k: int, row_ids=None) -> list[tuple[int, float]]:
+        """
+        Return the top-k (row_id, cosine score) pairs, optionally restricted
+        to the given row ids.
+        """
+        if self.count == 0 or k <= 0:
+            return []
+        query = np.asarray(query_vector, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+
+        if row_ids is not None:
+            rows = np.asarray(sorted(row_ids), dtype=np.int64)
+            if rows.size == 0:
+                return []
+            scores = self.vectors[rows].astype(np.float32) @ query
+        else:
+            rows = None
+            scores = np.empty(self.count, dtype=np.float32)
+            for start in range(0, self.count, SEARCH_BLOCK_ROWS):
+                block = self.vectors[start:start + SEARCH_BLOCK_ROWS]
+                scores[start:start + len(block)] = block.astype(np.float32) @ query
+
+        k = min(k, scores.shape[0])
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        ids = rows[top] if rows is not None else top
+        return [(int(i), float(scores[j])) for i, j in zip(ids, top)]
+
+    def filter_rows(self, file_types=None, sources=None):
+        """
+        Row ids whose chunk metadata matches the filters, or None when no
+        filter applies. Uses the SQLite column indexes, not the vectors.
+        """
+        clauses, params = [], []
+        if file_types:
+            clauses.append(f"file_type IN ({','.join('?' * len(file_types))})")
+            params.extend(file_types)
+        if sources:
+            clauses.append(f"source IN ({','.join('?' * len(sources))})")
+            params.extend(sources)
+        if not clauses:
+            return None
+        rows = self._conn().execute(
+            f"SELECT id FROM chunks WHERE {' AND '.join(clauses)}", params).fetchall()
+        return [row_id for (row_id,) in rows]
+
+    def get_vectors(self, row_ids) -> np.ndarray:
+        return np.asarray(self.vectors[np.asarray(row_ids, dtype=np.int64)], dtype=np.float32)
+
+    def fetch(self, row_ids) -> dict[int, tuple[str, dict]]:
+        """
+        Read the text and metadata of the given rows.
+        """
+        row_ids = [int(i) for i in row_ids]
+        if not row_ids:
+            return {}
+        placeholders = ",".join("?" * len(row_ids))
+        rows = self._conn().execute(
+            f"SELECT id, text, metadata FROM chunks WHERE id IN ({placeholders})",
+            row_ids).fetchall()
+        return {row_id: (text, json.loads(meta)) for row_id, text, meta in rows}
+
+    def similarity_search_with_score(self, query_vector, k: int) -> list[tuple[Document, float]]:
+        hits = self.search(query_vector, k)
+        chunks = self.fetch([row_id for row_id, _ in hits])
+        results = []
+        for row_id, score in hits:
+            text, metadata = chunks[row_id]
+            results.append((Document(page_content=text,
+                                     metadata={**metadata, "row_id": row_id}), score))
+        return results
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+class SessionIndexRetriever(BaseRetriever):
+    """
+    LangChain retriever over a SessionIndex, so it plugs into chains.
+    """
+
+    index: SessionIndex
+    embeddings: object
+    k: int = 10
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    def _get_relevant_documents(self, query: str, *,
+                                run_manager: CallbackManagerForRetrieverRun) -> list[Document]:
+        query_vector = self.embeddings.embed_query(query)
+        results = self.index.similarity_search_with_score(query_vector, self.k)
+        return [doc for doc, _ in results]
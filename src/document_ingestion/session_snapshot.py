@@ -0,0 +1,445 @@
+import os
+import sys
+import json
+import zlib
+import shutil
+import uuid
+import struct
+import hashlib
+from datetime import datetime, timezone
+import numpy as np
+from logger.custom_logger import CustomLogger
+from exception.custom_exception_archive import DocumentPortalException
+from utils.config_loader import load_config
+from utils.path_utils import path_under
+from src.document_ingestion.index_store import (
+    HEADER_FILE, VECTORS_FILE, CHUNKS_FILE, current_build_files, remove_stale_builds)
+from src.document_ingestion.summary_index import SUMMARY_LAYER
+
+# File layout:
+#   MAGIC | section ... section | manifest JSON | sha256(manifest) | len(manifest) u64 | MAGIC
+# Vector sections are stored raw at page-aligned offsets so they can be
+# memory-mapped straight from the snapshot; everything else is zlib-compressed.
+SNAPSHOT_FORMAT = "document_portal_snapshot"
+SNAPSHOT_VERSION = 1
+SNAPSHOT_SUFFIX = ".dpsnap"
+MAGIC = b"DPSNAP01"
+_TRAILER = struct.Struct("<32sQ8s")
+PAGE_SIZE = 4096
+COPY_BLOCK = 1024 * 1024
+HISTORY_FILE = "history.json"
+# Store object naming the current snapshot of a session
+LATEST_KEY = "latest.json"
+
+
+def snapshot_digest(snapshot_path: str) -> str:
+    """
+    The manifest sha256 recorded in a snapshot's trailer, which identifies
+    its contents; reads only the trailer.
+    """
+    with open(snapshot_path, "rb") as f:
+        f.seek(-_TRAILER.size, os.SEEK_END)
+        digest, _, magic = _TRAILER.unpack(f.read(_TRAILER.size))
+    if magic != MAGIC:
+        raise ValueError(f"Truncated session snapshot: {snapshot_path}")
+    return digest.hex()
+
+
+class LocalObjectStore:
+    """
+    Local stand-in for an object store: keys are files under a root
+    directory, typically a mount shared by all workers. Objects are
+    replaced atomically, so readers that mapped an older version keep it.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, key: str) -> str:
+        path = os.path.normpath(os.path.join(self.root, key))
+        if not path.startswith(os.path.normpath(self.root) + os.sep):
+            raise ValueError(f"Invalid object key: {key}")
+        return path
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self.path(key))
+
+    def put_file(self, key: str, file_path: str) -> str:
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{uuid.uuid4().hex}.part"
+        shutil.copyfile(file_path, temp_path)
+        os.replace(temp_path, path)
+        return path
+
+    def put_bytes(self, key: str, data: bytes) -> str:
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{uuid.uuid4().hex}.part"
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+        return path
+
+    def get_file(self, key: str, dest_path: str) -> str:
+        shutil.copyfile(self.path(key), dest_path)
+        return dest_path
+
+    def get_bytes(self, key: str) -> bytes:
+        with open(self.path(key), "rb") as f:
+            return f.read()
+
+
+class SessionSnapshotter:
+    """
+    Exports a chat session (chunk index, summary index, chat history) as a
+    single checksummed snapshot file and imports it on any worker without
+    re-embedding. By default an import maps the vectors in place from the
+    snapshot and only unpacks the small SQLite and JSON sections.
+    Published snapshots are immutable store objects keyed by their manifest
+    digest; a small "latest" object names the current one. Imported headers
+    record that digest, so a session is re-imported when a newer snapshot
+    is published and never reads a snapshot other than the one it imported.
+    Chat history is only carried when asked for (the snapshot endpoint, not
+    the republish after each index build), and an import never replaces a
+    local history written after the snapshot's copy.
+    """
+
+    def __init__(self, index_dir: str = None, store: LocalObjectStore = None):
+        self.log = CustomLogger().get_logger(__name__)
+        try:
+            self.config = load_config()
+            snapshot_config = self.config.get("snapshots", {})
+            self.index_dir = index_dir or self.config["faiss_db"].get("index_dir", "faiss_index")
+            self.store = store or LocalObjectStore(snapshot_config.get("store_dir", "snapshots"))
+            self.verify_vectors = snapshot_config.get("verify_vectors", True)
+            self.materialize = snapshot_config.get("materialize", False)
+        except Exception as e:
+            self.log.error("Error initializing SessionSnapshotter", error=str(e))
+            raise DocumentPortalException("Error initializing SessionSnapshotter", sys) from e
+
+    @staticmethod
+    def store_key(tenant_id: str, session_id: str, digest: str) -> str:
+        return f"{tenant_id}/{session_id}/{digest}{SNAPSHOT_SUFFIX}"
+
+    @staticmethod
+    def latest_key(tenant_id: str, session_id: str) -> str:
+        return f"{tenant_id}/{session_id}/{LATEST_KEY}"
+
+    def session_path(self, tenant_id: str, session_id: str) -> str:
+        # Ids also arrive from snapshot manifests; neither may leave index_dir
+        return path_under(self.index_dir, tenant_id, session_id)
+
+    def export(self, tenant_id: str, session_id: str, snapshot_path: str,
+               include_history: bool = True) -> dict:
+        """
+        Write the session to `snapshot_path` and return its manifest.
+        """
+        try:
+            session_path = self.session_path(tenant_id, session_id)
+            if not os.path.exists(os.path.join(session_path, HEADER_FILE)):
+                raise ValueError(f"No index for session {session_id}")
+
+            sections = []
+            os.makedirs(os.path.dirname(os.path.abspath(snapshot_path)), exist_ok=True)
+            with open(snapshot_path + ".part", "wb") as out:
+                out.write(MAGIC)
+                for layer in ("", SUMMARY_LAYER):
+                    layer_path = os.path.join(session_path, layer)
+                    if not os.path.exists(os.path.join(layer_path, HEADER_FILE)):
+                        continue
+                    with open(os.path.join(layer_path, HEADER_FILE)) as f:
+                        header = json.load(f)
+                    source, offset, length = self._vector_source(layer_path, header)
+                    chunks_path = os.path.join(
+                        layer_path, header.get("chunks_path", CHUNKS_FILE))
+                    # Sections use the unversioned file names, so headers are
+                    # stored without the writer's build files or the location
+                    # and digest of an earlier import
+                    header.pop("vectors_path", None)
+                    header.pop("vectors_offset", None)
+                    header.pop("chunks_path", None)
+                    header.pop("snapshot_sha256", None)
+                    sections.append(self._write_section(
+                        out, os.path.join(layer, HEADER_FILE),
+                        json.dumps(header, indent=2).encode("utf-8")))
+                    sections.append(self._write_raw(
+                        out, os.path.join(layer, VECTORS_FILE), source, offset, length))
+                    with open(chunks_path, "rb") as f:
+                        sections.append(self._write_section(
+                            out, os.path.join(layer, CHUNKS_FILE), f.read()))
+
+                history_path = os.path.join(session_path, HISTORY_FILE)
+                history_mtime = None
+                if include_history and os.path.exists(history_path):
+                    with open(history_path, "rb") as f:
+                        history_mtime = os.fstat(f.fileno()).st_mtime
+                        sections.append(self._write_section(out, HISTORY_FILE, f.read()))
+
+                manifest = {
+                    "format": SNAPSHOT_FORMAT,
+                    "version": SNAPSHOT_VERSION,
+                    "tenant_id": tenant_id,
+                    "session_id": session_id,
+                    "created_at": datetime.now(timezone.utc).isoformat(),
+                    "history_mtime": history_mtime,
+                    "sections": sections,
+                }
+                encoded = json.dumps(manifest).encode("utf-8")
+                out.write(encoded)
+                out.write(_TRAILER.pack(hashlib.sha256(encoded).digest(), len(encoded), MAGIC))
+            os.replace(snapshot_path + ".part", snapshot_path)
+
+            self.log.info("Session snapshot exported", tenant_id=tenant_id,
+                          session_id=session_id, snapshot_path=snapshot_path,
+                          size_bytes=os.path.getsize(snapshot_path))
+            return manifest
+        except Exception as e:
+            self.log.error("Error exporting session snapshot", error=str(e),
+                           session_id=session_id)
+            raise DocumentPortalException("Error exporting session snapshot", sys) from e
+
+    def import_(self, snapshot_path: str, tenant_id: str = None,
+                materialize: bool = None, overwrite: bool = False) -> dict:
+        """
+        Recreate the session under the index directory and return the
+        manifest. Unless `materialize`, the session's headers point into
+        the snapshot file, which must then never change; store objects
+        from export_to_store are immutable. With `overwrite`, a session
+        that already exists is switched over to this snapshot.
+        """
+        session_path = None
+        written = []
+        try:
+            materialize = self.materialize if materialize is None else materialize
+            snapshot_path = os.path.abspath(snapshot_path)
+            manifest, digest = self._load_manifest(snapshot_path)
+            tenant_id = tenant_id or manifest["tenant_id"]
+            session_id = manifest["session_id"]
+            session_path = self.session_path(tenant_id, session_id)
+            if os.path.exists(os.path.join(session_path, HEADER_FILE)) and not overwrite:
+                raise ValueError(f"Session {session_id} already exists")
+
+            # Files are named after the snapshot, so re-imports and concurrent
+            # imports never touch files an open SessionIndex is using
+            build = digest[:16]
+            headers, history = {}, None
+            with open(snapshot_path, "rb") as f:
+                for section in manifest["sections"]:
+                    name = section["name"]
+                    layer, base = os.path.dirname(name), os.path.basename(name)
+                    layer_path = os.path.join(session_path, layer)
+                    os.makedirs(layer_path, exist_ok=True)
+                    if base == VECTORS_FILE:
+                        if self.verify_vectors or materialize:
+                            dest = os.path.join(layer_path, f"vectors-{build}.bin") \
+                                if materialize else None
+                            self._copy_verified(f, section, dest)
+                            if dest:
+                                written.append(dest)
+                        continue
+                    data = self._read_section(f, section)
+                    if base == HEADER_FILE:
+                        headers[layer] = json.loads(data)
+                    elif base == HISTORY_FILE:
+                        history = data
+                    else:
+                        written.append(self._write_atomic(
+                            os.path.join(layer_path, f"chunks-{build}.sqlite"), data))
+
+            # Headers are swapped in last, summaries before the main index, so
+            # the session is only discovered once complete
+            vector_sections = {os.path.dirname(s["name"]): s for s in manifest["sections"]
+                               if os.path.basename(s["name"]) == VECTORS_FILE}
+            if history is not None:
+                self._import_history(session_path, history, manifest)
+            for layer in sorted(headers, key=lambda name: name == ""):
+                header = headers[layer]
+                layer_path = os.path.join(session_path, layer)
+                previous = current_build_files(layer_path)
+                header.update(tenant_id=tenant_id, snapshot_sha256=digest,
+                              chunks_path=f"chunks-{build}.sqlite")
+                if materialize:
+                    header["vectors_path"] = f"vectors-{build}.bin"
+                else:
+                    header["vectors_path"] = snapshot_path
+                    header["vectors_offset"] = vector_sections[layer]["offset"]
+                self._write_atomic(os.path.join(layer_path, HEADER_FILE),
+                                   json.dumps(header, indent=2).encode("utf-8"))
+                remove_stale_builds(layer_path, keep=previous | current_build_files(layer_path))
+
+            self.log.info("Session snapshot imported", tenant_id=tenant_id,
+                          session_id=session_id, snapshot_path=snapshot_path,
+                          snapshot_sha256=digest, materialized=materialize)
+            return manifest
+        except Exception as e:
+            if session_path and not os.path.exists(os.path.join(session_path, HEADER_FILE)):
+                shutil.rmtree(session_path, ignore_errors=True)
+            else:
+                for path in written:
+                    if os.path.basename(path) not in current_build_files(os.path.dirname(path)):
+                        os.remove(path)
+            self.log.error("Error importing session snapshot", error=str(e),
+                           snapshot_path=snapshot_path)
+            raise DocumentPortalException("Error importing session snapshot", sys) from e
+
+    def _import_history(self, session_path: str, history: bytes, manifest: dict):
+        history_path = os.path.join(session_path, HISTORY_FILE)
+        snapshot_mtime = manifest.get("history_mtime") or 0
+        if os.path.exists(history_path) and os.path.getmtime(history_path) > snapshot_mtime:
+            # Turns answered here since the snapshot was taken would be lost
+            self.log.info("Keeping newer local chat history", history_path=history_path)
+            return
+        self._write_atomic(history_path, history)
+        if snapshot_mtime:
+            # Keep the source's time, so only turns answered here count as newer
+            os.utime(history_path, (snapshot_mtime, snapshot_mtime))
+
+    def export_to_store(self, tenant_id: str, session_id: str,
+                        include_history: bool = False) -> str:
+        """
+        Export the session, publish it to the object store under a new
+        immutable key and make it the session's latest snapshot; returns
+        the key. Chat history is included only with `include_history`.
+        """
+        local_path = f"{self.session_path(tenant_id, session_id)}.{uuid.uuid4().hex}{SNAPSHOT_SUFFIX}"
+        try:
+            self.export(tenant_id, session_id, local_path, include_history=include_history)
+            digest = snapshot_digest(local_path)
+            key = self.store_key(tenant_id, session_id, digest)
+            self.store.put_file(key, local_path)
+            self.store.put_bytes(self.latest_key(tenant_id, session_id), json.dumps(
+                {"key": key, "snapshot_sha256": digest}).encode("utf-8"))
+        finally:
+            if os.path.exists(local_path):
+                os.remove(local_path)
+        return key
+
+    def ensure_local(self, tenant_id: str, session_id: str) -> bool:
+        """
+        Make a session available on this worker, importing its latest
+        snapshot from the store when the session is missing or was imported
+        from an older snapshot. Sessions indexed on this worker are left
+        alone. Returns True if it was imported. Safe to call concurrently.
+        """
+        session_path = self.session_path(tenant_id, session_id)
+        header_path = os.path.join(session_path, HEADER_FILE)
+        local_digest = None
+        if os.path.exists(header_path):
+            with open(header_path) as f:
+                local_digest = json.load(f).get("snapshot_sha256")
+            if local_digest is None:
+                return False
+        latest_key = self.latest_key(tenant_id, session_id)
+        if not self.store.exists(latest_key):
+            return False
+        latest = json.loads(self.store.get_bytes(latest_key))
+        if latest["snapshot_sha256"] == local_digest:
+            return False
+        # Map straight from the immutable store object (a shared mount) instead of copying
+        self.import_(self.store.path(latest["key"]), tenant_id=tenant_id, overwrite=True)
+        return True
+
+    @staticmethod
+    def _write_atomic(path: str, data: bytes) -> str:
+        temp_path = f"{path}.{uuid.uuid4().hex}.part"
+        with open(temp_path, "wb") as out:
+            out.write(data)
+        os.replace(temp_path, path)
+        return path
+
+    @classmethod
+    def read_manifest(cls, snapshot_path: str) -> dict:
+        return cls._load_manifest(snapshot_path)[0]
+
+    @staticmethod
+    def _load_manifest(snapshot_path: str) -> tuple[dict, str]:
+        with open(snapshot_path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"Not a session snapshot: {snapshot_path}")
+            f.seek(-_TRAILER.size, os.SEEK_END)
+            digest, length, magic = _TRAILER.unpack(f.read(_TRAILER.size))
+            if magic != MAGIC:
+                raise ValueError(f"Truncated session snapshot: {snapshot_path}")
+            f.seek(-_TRAILER.size - length, os.SEEK_END)
+            encoded = f.read(length)
+        if hashlib.sha256(encoded).digest() != digest:
+            raise ValueError(f"Corrupt snapshot manifest: {snapshot_path}")
+        manifest = json.loads(encoded)
+        if manifest.get("format") != SNAPSHOT_FORMAT or \
+                manifest.get("version", 0) > SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported snapshot: {snapshot_path}")
+        return manifest, digest.hex()
+
+    @staticmethod
+    def _vector_source(layer_path: str, header: dict) -> tuple[str, int, int]:
+        length = header["count"] * header["dim"] * np.dtype(header["dtype"]).itemsize
+        path = os.path.join(layer_path, header.get("vectors_path", VECTORS_FILE))
+        return path, int(header.get("vectors_offset", 0)), length
+
+    @staticmethod
+    def _write_section(out, name: str, data: bytes) -> dict:
+        compressed = zlib.compress(data, 6)
+        offset = out.tell()
+        out.write(compressed)
+        return {"name": name, "offset": offset, "length": len(compressed),
+                "raw_length": len(data), "compression": "zlib",
+                "sha256": hashlib.sha256(compressed).hexdigest()}
+
+    @staticmethod
+    def _write_raw(out, name: str, source: str, offset: int, length: int) -> dict:
+        out.write(b"\0" * (-out.tell() % PAGE_SIZE))
+        start = out.tell()
+        hasher = hashlib.sha256()
+        with open(source, "rb") as f:
+            f.seek(offset)
+            remaining = length
+            while remaining:
+                block = f.read(min(COPY_BLOCK, remaining))
+                if not block:
+                    raise ValueError(f"Vector file too short: {source}")
+                hasher.update(block)
+                out.write(block)
+                remaining -= len(block)
+        return {"name": name, "offset": start, "length": length, "raw_length": length,
+                "compression": "none", "sha256": hasher.hexdigest()}
+
+    @staticmethod
+    def _read_section(f, section: dict) -> bytes:
+        f.seek(section["offset"])
+        data = f.read(section["length"])
+        if hashlib.sha256(data).hexdigest() != section["sha256"]:
+            raise ValueError(f"Checksum mismatch in section {section['name']}")
+        return zlib.decompress(data) if section["compression"] == "zlib" else data
+
+    @staticmethod
+    def _copy_verified(f, section: dict, dest_path: str = None):
+        """
+        Checksum a raw section, copying it to `dest_path` if given. The copy
+        only appears under its name once verified.
+        """
+        f.seek(section["offset"])
+        hasher = hashlib.sha256()
+        temp_path = f"{dest_path}.{uuid.uuid4().hex}.part" if dest_path else None
+        out = open(temp_path, "wb") if temp_path else None
+        try:
+            remaining = section["length"]
+            while remaining:
+                block = f.read(min(COPY_BLOCK, remaining))
+                if not block:
+                    raise ValueError(f"Truncated section {section['name']}")
+                hasher.update(block)
+                if out:
+                    out.write(block)
+                remaining -= len(block)
+            if hasher.hexdigest() != section["sha256"]:
+                raise ValueError(f"Checksum mismatch in section {section['name']}")
+            if out:
+                out.close()
+                os.replace(temp_path, dest_path)
+        finally:
+            if out:
+                out.close()
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
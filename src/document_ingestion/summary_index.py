@@ -0,0 +1,122 @@
+import os
+import sys
+import json
+from itertools import groupby
+from langchain_core.documents import Document
+from langchain_core.output_parsers import StrOutputParser
+from logger.custom_logger import CustomLogger
+from exception.custom_exception_archive import DocumentPortalException
+from model.models import PromptType
+from prompt.prompt_library import PROMPT_REGISTRY
+from utils.LLm_utils import select_key_sentences
+from src.document_ingestion.index_store import SessionIndexWriter
+
+# Bump when prompts or grouping change, so cached summaries are rebuilt
+SUMMARY_VERSION = 2
+SUMMARY_LAYER = "summaries"
+
+
+class SummaryIndexBuilder:
+    """
+    Builds a two-level summary tree (sections, then the whole document)
+    next to a session's chunk index. Summaries are computed once per
+    document and cached by content hash, so re-uploads cost nothing.
+    """
+
+    def __init__(self, llm, embeddings, cache_dir: str = "summary_cache",
+                 section_token_budget: int = 1500, vector_dtype: str = "float16"):
+        self.log = CustomLogger().get_logger(__name__)
+        self.embeddings = embeddings
+        self.cache_dir = cache_dir
+        self.section_token_budget = section_token_budget
+        self.vector_dtype = vector_dtype
+        self.section_chain = (PROMPT_REGISTRY[PromptType.SECTION_SUMMARY.value]
+                              | llm | StrOutputParser())
+        self.document_chain = (PROMPT_REGISTRY[PromptType.DOCUMENT_SUMMARY_ROLLUP.value]
+                               | llm | StrOutputParser())
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def build(self, chunks: list[Document], content_hashes: dict[str, str],
+              index_path: str, header_extra: dict = None) -> str:
+        """
+        Summarize every source document among `chunks` and write the
+        summary nodes as a session index under <index_path>/summaries.
+        `content_hashes` maps source file name to its content hash.
+        """
+        try:
+            nodes = []
+            for source, source_chunks in groupby(
+                    sorted(chunks, key=lambda c: c.metadata.get("source") or ""),
+                    key=lambda c: c.metadata.get("source")):
+                tree = self._summarize_document(
+                    source, list(source_chunks), content_hashes.get(source))
+                nodes.extend(self._tree_nodes(source, tree))
+
+            summary_path = os.path.join(index_path, SUMMARY_LAYER)
+            texts = [node.page_content for node in nodes]
+            vectors = self.embeddings.embed_documents(texts)
+            SessionIndexWriter(dtype=self.vector_dtype).write(
+                summary_path, texts, [node.metadata for node in nodes], vectors,
+                header_extra={**(header_extra or {}), "layer": SUMMARY_LAYER})
+
+            self.log.info("Summary index built", index_path=summary_path,
+                          nodes=len(nodes))
+            return summary_path
+        except Exception as e:
+            self.log.error("Error building summary index", error=str(e),
+                           index_path=index_path)
+            raise DocumentPortalException("Error building summary index", sys) from e
+
+    def _summarize_document(self, source: str, chunks: list[Document], content_hash: str) -> dict:
+        cache_path = os.path.join(
+            self.cache_dir, f"{content_hash}_v{SUMMARY_VERSION}.json") if content_hash else None
+        if cache_path and os.path.exists(cache_path):
+            with open(cache_path) as f:
+                self.log.info("Summary cache hit", source=source)
+                return json.load(f)
+
+        chunks = sorted((c for c in chunks if not c.metadata.get("boilerplate")),
+                        key=lambda c: c.metadata.get("start_index", -1))
+        sections = []
+        for heading, section_chunks in groupby(chunks, key=lambda c: c.metadata.get("heading")):
+            section_chunks = list(section_chunks)
+            text = select_key_sentences(
+                "\n".join(c.page_content for c in section_chunks), self.section_token_budget)
+            if not text.strip():
+                continue
+            sections.append({
+                "heading": heading or "Untitled section",
+                "page": section_chunks[0].metadata.get("page"),
+                "page_end": section_chunks[-1].metadata.get("page"),
+                "summary": self.section_chain.invoke(
+                    {"source": source, "heading": heading or "Untitled section",
+                     "section_text": text}),
+            })
+
+        section_summaries = "\n\n".join(
+            f"{s['heading']}: {s['summary']}" for s in sections)
+        tree = {
+            "source": source,
+            "sections": sections,
+            "document": self.document_chain.invoke(
+                {"source": source, "section_summaries": section_summaries}),
+        }
+        if cache_path:
+            with open(cache_path, "w") as f:
+                json.dump(tree, f)
+        return tree
+
+    @staticmethod
+    def _tree_nodes(source: str, tree: dict) -> list[Document]:
+        sections = tree["sections"]
+        nodes = [Document(page_content=tree["document"], metadata={
+            "source": source, "level": "document", "heading": None,
+            "page": sections[0]["page"] if sections else None,
+            "page_end": sections[-1]["page_end"] if sections else None,
+            "start_index": -1, "end_index": -1})]
+        for section in sections:
+            nodes.append(Document(page_content=section["summary"], metadata={
+                "source": source, "level": "section", "heading": section["heading"],
+                "page": section["page"], "page_end": section["page_end"],
+                "start_index": -1, "end_index": -1}))
+        return nodes
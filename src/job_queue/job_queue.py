@@ -0,0 +1,222 @@
+import os
+import sys
+import json
+import uuid
+import random
+import socket
+import hashlib
+import threading
+from pathlib import Path
+from logger.custom_logger import CustomLogger
+from logger.tracing import start_trace, current_request_id, current_profile
+from exception.custom_exception_archive import DocumentPortalException
+from utils.config_loader import load_config
+from src.job_queue.job_store import JobStore
+from src.document_analyser.data_analysis import DocumentAnalyser
+from src.document_compare.document_comparartor import DocumentComparatorLLM
+from src.document_ingestion.data_ingestion import DocumentHandler, ChatIngestor
+from src.document_ingestion.session_snapshot import SessionSnapshotter
+
+# Larger value is served first
+PRIORITY_INTERACTIVE = 10
+PRIORITY_DEFAULT = 5
+PRIORITY_BULK = 0
+
+
+class JobQueue:
+    """
+    Runs long analysis, comparison and indexing work on a pool of background
+    workers. Submitting returns a job id immediately; progress and results
+    are kept in a SQLite JobStore so they survive restarts. Jobs are leased
+    to this queue while they run and a heartbeat renews the leases, so
+    queues in sibling processes only take over jobs whose owner is gone.
+    Failed attempts are retried with exponential backoff.
+    """
+
+    def __init__(self, handlers: dict = None, db_path: str = None, workers: int = None):
+        self.log = CustomLogger().get_logger(__name__)
+        try:
+            jobs_config = load_config().get("jobs", {})
+            self.workers = workers or int(jobs_config.get("workers", 4))
+            self.max_attempts = int(jobs_config.get("max_attempts", 3))
+            self.poll_interval = float(jobs_config.get("poll_interval_seconds", 1.0))
+            self.lease_seconds = float(jobs_config.get("lease_seconds", 60))
+            self.retry_backoff = float(jobs_config.get("retry_backoff_seconds", 5))
+            self.retry_backoff_max = float(jobs_config.get("retry_backoff_max_seconds", 300))
+            self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+            self.store = JobStore(db_path or jobs_config.get(
+                "db_path", os.path.join("jobs", "jobs.sqlite")))
+            self.handlers = handlers if handlers is not None else default_handlers()
+
+            self._wakeup = threading.Event()
+            self._stopping = threading.Event()
+            self._threads = []
+            self._running = set()  # ids of the jobs this queue holds leases on
+            self._running_lock = threading.Lock()
+            self.log.info("JobQueue initialized", workers=self.workers,
+                          kinds=list(self.handlers.keys()), owner=self.owner)
+        except Exception as e:
+            self.log.error("Error initializing JobQueue", error=str(e))
+            raise DocumentPortalException("Error initializing JobQueue", sys) from e
+
+    def start(self):
+        """
+        Requeue work whose owner died and start the workers and the heartbeat.
+        """
+        self._recover()
+        self._stopping.clear()
+        for i in range(self.workers):
+            thread = threading.Thread(
+                target=self._worker_loop, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        thread = threading.Thread(target=self._heartbeat_loop, name="job-heartbeat", daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def stop(self, timeout: float = 5.0):
+        self._stopping.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def submit(self, kind: str, payload: dict, tenant_id: str = "default",
+               priority: int = PRIORITY_DEFAULT, dedup_key: str = None) -> dict:
+        """
+        Queue a job and return {"job_id", "deduplicated"} straight away.
+        Identical jobs (same kind, tenant and dedup key) that are still queued
+        or running are not queued twice. The job is traced under the
+        submitting request's id and profiled if that request was.
+        """
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        key = hashlib.sha256(json.dumps(
+            [kind, tenant_id, dedup_key or payload], sort_keys=True, default=str
+        ).encode("utf-8")).hexdigest()
+        job_id, deduplicated = self.store.submit(
+            kind, tenant_id, payload, priority, key,
+            request_id=current_request_id(), profile=current_profile())
+        self.log.info("Job submitted", job_id=job_id, kind=kind,
+                      tenant_id=tenant_id, priority=priority,
+                      deduplicated=deduplicated)
+        self._wakeup.set()
+        return {"job_id": job_id, "deduplicated": deduplicated}
+
+    def get(self, job_id: str):
+        return self.store.get(job_id)
+
+    def pending(self, tenant_id: str) -> int:
+        return self.store.pending_count(tenant_id)
+
+    def _recover(self):
+        requeued = self.store.recover(self.max_attempts)
+        if requeued:
+            self.log.info("Requeued jobs with expired leases", count=requeued)
+
+    def _heartbeat_loop(self):
+        """
+        Renew the leases of running jobs well before they expire, and take
+        over jobs whose owner stopped renewing them.
+        """
+        while not self._stopping.wait(self.lease_seconds / 3):
+            try:
+                with self._running_lock:
+                    running = list(self._running)
+                self.store.renew_leases(self.owner, running, self.lease_seconds)
+                self._recover()
+            except Exception as e:
+                self.log.error("Job heartbeat failed", error=str(e))
+
+    def _retry_delay(self, attempts: int) -> float:
+        # Exponential backoff with jitter, so rate-limited jobs do not retry in lockstep
+        delay = min(self.retry_backoff_max, self.retry_backoff * 2 ** (attempts - 1))
+        return delay * random.uniform(0.5, 1.0)
+
+    def _worker_loop(self):
+        while not self._stopping.is_set():
+            job = self.store.claim_next(self.owner, self.lease_seconds)
+            if job is None:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+            self._run(job)
+
+    def _run(self, job: dict):
+        job_id = job["id"]
+
+        def report_progress(progress: float, message: str = None):
+            self.store.update_progress(job_id, progress, message)
+
+        with self._running_lock:
+            self._running.add(job_id)
+        try:
+            # Jobs run on worker threads, so each gets its own trace, under the
+            # id of the request that submitted it (the job id if there was none)
+            with start_trace(f"job.{job['kind']}", request_id=job["request_id"] or job_id,
+                             profile=bool(job["profile"]), job_id=job_id,
+                             tenant_id=job["tenant_id"], attempt=job["attempts"]):
+                self.log.info("Job started", job_id=job_id, kind=job["kind"],
+                              attempt=job["attempts"])
+                result = self.handlers[job["kind"]](job["payload"], report_progress)
+            self.store.complete(job_id, result, self.owner)
+            self.log.info("Job succeeded", job_id=job_id, kind=job["kind"])
+        except Exception as e:
+            retry_after = self._retry_delay(job["attempts"]) \
+                if job["attempts"] < self.max_attempts else None
+            self.store.fail(job_id, str(e), self.owner, retry_after=retry_after)
+            self.log.error("Job failed", job_id=job_id, kind=job["kind"],
+                           error=str(e), will_retry=retry_after is not None,
+                           retry_after=retry_after)
+        finally:
+            with self._running_lock:
+                self._running.discard(job_id)
+
+
+def default_handlers() -> dict:
+    """
+    Job kinds backed by the document portal components.
+    """
+    return {
+        "analyze": run_analysis_job,
+        "compare": run_comparison_job,
+        "index": run_index_job,
+    }
+
+
+def run_analysis_job(payload: dict, report_progress) -> dict:
+    report_progress(0.1, "Loading analyser")
+    analyser = DocumentAnalyser()
+    report_progress(0.3, "Analysing document")
+    return analyser.analyze_file(payload["file_path"])
+
+
+def run_comparison_job(payload: dict, report_progress) -> list:
+    report_progress(0.1, "Reading documents")
+    handler = DocumentHandler(data_dir=payload["data_dir"],
+                              session_id=payload["session_id"])
+    combined_text = handler.combine_documents(
+        [payload["reference_path"], payload["actual_path"]])
+    report_progress(0.4, "Comparing documents")
+    df = DocumentComparatorLLM().compare_documents(combined_text)
+    return df.to_dict(orient="records")
+
+
+def run_index_job(payload: dict, report_progress) -> dict:
+    report_progress(0.1, "Preparing ingestion")
+    ingestor = ChatIngestor(tenant_id=payload["tenant_id"],
+                            session_id=payload["session_id"],
+                            data_dir=payload.get("data_dir"))
+    report_progress(0.3, "Building index")
+    # All of the session's files, not just this upload: the index is replaced
+    # as a whole, and files from concurrent uploads are picked up as well
+    ingestor.rebuild_index(payload.get("content_hashes"))
+    result = {"session_id": ingestor.session_id,
+              "index_path": str(Path(ingestor.index_path))}
+    if ingestor.config.get("snapshots", {}).get("enabled", False):
+        report_progress(0.9, "Publishing snapshot")
+        # Index only: chat history is published by the snapshot endpoint, so a
+        # rebuild does not roll back other workers' conversations
+        result["snapshot_key"] = SessionSnapshotter().export_to_store(
+            payload["tenant_id"], ingestor.session_id)
+    return result
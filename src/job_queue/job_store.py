@@ -0,0 +1,250 @@
+import os
+import json
+import uuid
+import sqlite3
+import threading
+from datetime import datetime, timedelta, timezone
+from logger.custom_logger import CustomLogger
+
+# Job lifecycle states
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id          TEXT PRIMARY KEY,
+    kind        TEXT NOT NULL,
+    tenant_id   TEXT NOT NULL,
+    priority    INTEGER NOT NULL,
+    payload     TEXT NOT NULL,
+    dedup_key   TEXT NOT NULL,
+    status      TEXT NOT NULL,
+    progress    REAL NOT NULL DEFAULT 0,
+    message     TEXT,
+    result      TEXT,
+    error       TEXT,
+    attempts    INTEGER NOT NULL DEFAULT 0,
+    created_at  TEXT NOT NULL,
+    updated_at  TEXT NOT NULL,
+    owner       TEXT,
+    lease_until TEXT,
+    not_before  TEXT,
+    request_id  TEXT,
+    profile     INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, priority);
+CREATE INDEX IF NOT EXISTS idx_jobs_tenant ON jobs (tenant_id, status);
+-- Only one identical job may be in flight at a time
+CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_inflight
+    ON jobs (dedup_key) WHERE status IN ('queued', 'running');
+CREATE TABLE IF NOT EXISTS tenants (
+    tenant_id       TEXT PRIMARY KEY,
+    last_served_at  TEXT NOT NULL
+);
+"""
+
+# Columns added after the first release, for databases created before them
+_ADDED_COLUMNS = {
+    "owner": "TEXT",        # JobQueue instance running the job
+    "lease_until": "TEXT",  # a RUNNING job whose lease passed has lost its owner
+    "not_before": "TEXT",   # a retried job waits until then
+    "request_id": "TEXT",   # request that submitted the job, for tracing
+    "profile": "INTEGER NOT NULL DEFAULT 0",
+}
+
+
+def _now(delay_seconds: float = 0) -> str:
+    # Fixed-width timestamps, so they compare correctly as text in SQL
+    return (datetime.now(timezone.utc) + timedelta(seconds=delay_seconds)).isoformat(
+        timespec="microseconds")
+
+
+class JobStore:
+    """
+    SQLite-backed store for background jobs, their progress and results.
+    Jobs persist across process restarts. Several processes may share the
+    database: a claimed job is leased to its owner, which renews the lease
+    while it runs, and only jobs whose lease expired are taken over.
+    """
+
+    def __init__(self, db_path: str):
+        self.log = CustomLogger().get_logger(__name__)
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            db_path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        for name, column_type in _ADDED_COLUMNS.items():
+            if name not in columns:
+                self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {name} {column_type}")
+        self.log.info("JobStore initialized", db_path=db_path)
+
+    def submit(self, kind: str, tenant_id: str, payload: dict, priority: int,
+               dedup_key: str, request_id: str = None,
+               profile: bool = False) -> tuple[str, bool]:
+        """
+        Insert a queued job, or return the id of an identical job already in flight.
+        Returns (job_id, deduplicated).
+        """
+        with self._lock:
+            existing = self._conn.execute(
+                "SELECT id FROM jobs WHERE dedup_key = ? AND status IN (?, ?)",
+                (dedup_key, QUEUED, RUNNING)).fetchone()
+            if existing:
+                return existing["id"], True
+
+            job_id = uuid.uuid4().hex
+            now = _now()
+            self._conn.execute(
+                "INSERT INTO jobs (id, kind, tenant_id, priority, payload, dedup_key, "
+                "status, created_at, updated_at, request_id, profile) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, kind, tenant_id, priority, json.dumps(payload),
+                 dedup_key, QUEUED, now, now, request_id, int(profile)))
+            return job_id, False
+
+    def claim_next(self, owner: str, lease_seconds: float):
+        """
+        Atomically move the next job that is due to RUNNING, leased to
+        `owner` for `lease_seconds`, and return it.
+        Higher priority wins; within a priority the tenant with the fewest
+        running jobs, then the one served least recently, goes first.
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    """
+                    SELECT j.* FROM jobs j
+                    LEFT JOIN (SELECT tenant_id, COUNT(*) AS running FROM jobs
+                               WHERE status = ? GROUP BY tenant_id) r
+                           ON r.tenant_id = j.tenant_id
+                    LEFT JOIN tenants t ON t.tenant_id = j.tenant_id
+                    WHERE j.status = ? AND (j.not_before IS NULL OR j.not_before <= ?)
+                    ORDER BY j.priority DESC,
+                             COALESCE(r.running, 0) ASC,
+                             COALESCE(t.last_served_at, '') ASC,
+                             j.created_at ASC
+                    LIMIT 1
+                    """, (RUNNING, QUEUED, _now())).fetchone()
+                if row is None:
+                    self._conn.execute("COMMIT")
+                    return None
+
+                now = _now()
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, attempts = attempts + 1, updated_at = ?, "
+                    "owner = ?, lease_until = ?, not_before = NULL WHERE id = ?",
+                    (RUNNING, now, owner, _now(lease_seconds), row["id"]))
+                self._conn.execute(
+                    "INSERT INTO tenants (tenant_id, last_served_at) VALUES (?, ?) "
+                    "ON CONFLICT(tenant_id) DO UPDATE SET last_served_at = excluded.last_served_at",
+                    (row["tenant_id"], now))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+        job = self._to_dict(row)
+        job["status"] = RUNNING
+        job["attempts"] += 1
+        job["owner"] = owner
+        return job
+
+    def renew_leases(self, owner: str, job_ids: list[str], lease_seconds: float):
+        """
+        Extend the leases `owner` holds on the given running jobs.
+        """
+        if not job_ids:
+            return
+        with self._lock:
+            self._conn.execute(
+                f"UPDATE jobs SET lease_until = ? WHERE owner = ? AND status = ? "
+                f"AND id IN ({', '.join('?' * len(job_ids))})",
+                (_now(lease_seconds), owner, RUNNING, *job_ids))
+
+    def update_progress(self, job_id: str, progress: float, message: str = None):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET progress = ?, message = ?, updated_at = ? WHERE id = ?",
+                (progress, message, _now(), job_id))
+
+    def complete(self, job_id: str, result, owner: str):
+        """
+        Record the result, unless the job was taken over after `owner` lost its lease.
+        """
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, progress = 1, result = ?, error = NULL, "
+                "owner = NULL, lease_until = NULL, updated_at = ? "
+                "WHERE id = ? AND owner = ? AND status = ?",
+                (SUCCEEDED, json.dumps(result, default=str), _now(), job_id, owner, RUNNING))
+
+    def fail(self, job_id: str, error: str, owner: str, retry_after: float = None):
+        """
+        Record a failure. With `retry_after` (seconds) the job is queued
+        again but not claimed before then; otherwise it fails for good.
+        """
+        retry = retry_after is not None
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, not_before = ?, owner = NULL, "
+                "lease_until = NULL, updated_at = ? WHERE id = ? AND owner = ? AND status = ?",
+                (QUEUED if retry else FAILED, error, _now(retry_after) if retry else None,
+                 _now(), job_id, owner, RUNNING))
+
+    def recover(self, max_attempts: int) -> int:
+        """
+        Requeue RUNNING jobs whose lease has expired, i.e. whose owner died
+        or hung; jobs other live processes are running keep their lease.
+        Gives up on jobs that already used all their attempts. Returns the
+        number of requeued jobs.
+        """
+        now = _now()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Rows from before leases existed have none and count as expired
+                expired = "status = ? AND (lease_until IS NULL OR lease_until < ?)"
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, error = 'Interrupted too many times', "
+                    f"owner = NULL, lease_until = NULL, updated_at = ? "
+                    f"WHERE {expired} AND attempts >= ?",
+                    (FAILED, now, RUNNING, now, max_attempts))
+                cursor = self._conn.execute(
+                    "UPDATE jobs SET status = ?, owner = NULL, lease_until = NULL, "
+                    f"updated_at = ? WHERE {expired}",
+                    (QUEUED, now, RUNNING, now))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            return cursor.rowcount
+
+    def pending_count(self, tenant_id: str) -> int:
+        """
+        Number of the tenant's jobs that are queued or running.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE tenant_id = ? AND status IN (?, ?)",
+                (tenant_id, QUEUED, RUNNING)).fetchone()
+        return row[0]
+
+    def get(self, job_id: str):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    @staticmethod
+    def _to_dict(row) -> dict:
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
@@ -0,0 +1,140 @@
+import asyncio
+from api.admission import AdmissionController, AdmissionMiddleware, AdmissionRejected
+
+
+def _controller(pending_jobs=None, **admission):
+    return AdmissionController({"admission": admission}, pending_jobs=pending_jobs)
+
+
+async def _hold(controller, tenant_id, lane, release, order, name):
+    async with controller.admit(tenant_id, lane):
+        order.append(name)
+        await release.wait()
+
+
+def test_freed_slot_goes_to_best_lane():
+    async def scenario():
+        controller = _controller(max_concurrency=1, tenant_max_concurrency=4)
+        order, release = [], asyncio.Event()
+        running = asyncio.create_task(_hold(controller, "a", "bulk", release, order, "first"))
+        await asyncio.sleep(0)
+        bulk = asyncio.create_task(_hold(controller, "b", "bulk", release, order, "bulk"))
+        await asyncio.sleep(0)
+        chat = asyncio.create_task(_hold(controller, "c", "interactive", release, order, "chat"))
+        await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(running, bulk, chat)
+        return order, controller
+
+    order, controller = asyncio.run(scenario())
+    assert order == ["first", "chat", "bulk"]
+    assert sum(controller._running.values()) == 0 and not controller._waiting
+    assert not controller._tenant_active
+
+
+def test_full_queue_is_rejected_with_retry_after():
+    async def scenario():
+        controller = _controller(max_concurrency=1, lanes={"bulk": {"max_queue": 1}})
+        release = asyncio.Event()
+        tasks = [asyncio.create_task(_hold(controller, tenant, "bulk", release, [], tenant))
+                 for tenant in ("a", "b")]
+        await asyncio.sleep(0)
+        try:
+            async with controller.admit("c", "bulk"):
+                pass
+        except AdmissionRejected as e:
+            rejected = e
+        release.set()
+        await asyncio.gather(*tasks)
+        return rejected
+
+    rejected = asyncio.run(scenario())
+    assert rejected.status_code == 503
+    assert int(rejected.headers["Retry-After"]) >= 1
+
+
+def test_queued_request_times_out_and_frees_its_place():
+    async def scenario():
+        controller = _controller(max_concurrency=1,
+                                 lanes={"interactive": {"max_wait_seconds": 0.05}})
+        release = asyncio.Event()
+        holder = asyncio.create_task(_hold(controller, "a", "interactive", release, [], "a"))
+        await asyncio.sleep(0)
+        try:
+            async with controller.admit("b", "interactive"):
+                pass
+        except AdmissionRejected as e:
+            status = e.status_code
+        release.set()
+        await holder
+        return status, controller
+
+    status, controller = asyncio.run(scenario())
+    assert status == 503
+    assert controller._queued["interactive"] == 0 and not controller._waiting
+    assert not controller._tenant_active
+
+
+def test_tenant_quotas_are_enforced():
+    async def scenario():
+        statuses = []
+        controller = _controller(tenant_max_concurrency=1)
+        async with controller.admit("a", "interactive"):
+            try:
+                async with controller.admit("a", "interactive"):
+                    pass
+            except AdmissionRejected as e:
+                statuses.append(e.status_code)
+            # Other tenants are unaffected
+            async with controller.admit("b", "interactive"):
+                pass
+
+        controller = _controller(tenant_tokens_per_minute=2000)
+        async with controller.admit("a", "interactive"):
+            pass
+        try:
+            async with controller.admit("a", "interactive"):
+                pass
+        except AdmissionRejected as e:
+            statuses.append(e.status_code)
+
+        controller = _controller(pending_jobs=lambda tenant_id: 25)
+        try:
+            async with controller.admit("a", "bulk", creates_job=True):
+                pass
+        except AdmissionRejected as e:
+            statuses.append(e.status_code)
+        return statuses
+
+    assert asyncio.run(scenario()) == [429, 429, 429]
+
+
+def test_middleware_rejects_before_reading_the_body():
+    calls = {"app": 0, "receive": 0}
+    sent = []
+
+    async def app(scope, receive, send):
+        calls["app"] += 1
+
+    async def receive():
+        calls["receive"] += 1
+        return {"type": "http.request", "body": b"x" * 10, "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    middleware = AdmissionMiddleware(
+        app, _controller(pending_jobs=lambda tenant_id: 25),
+        routes={("POST", "/chat/index"): ("bulk", True),
+                ("POST", "/chat/sessions/*/snapshot"): ("bulk", False)})
+    scope = {"type": "http", "method": "POST", "path": "/chat/index",
+             "headers": [(b"x-tenant-id", b"t1"), (b"content-length", b"10")]}
+    asyncio.run(middleware(scope, receive, send))
+
+    assert calls == {"app": 0, "receive": 0}
+    assert sent[0]["status"] == 429
+    assert any(name == b"retry-after" for name, _ in sent[0]["headers"])
+
+    snapshot = {**scope, "path": "/chat/sessions/s1/snapshot"}
+    asyncio.run(middleware(snapshot, receive, send))
+    assert calls["app"] == 1
@@ -0,0 +1,69 @@
+from langchain_core.documents import Document
+from utils.LLm_utils import count_tokens
+from src.document_ingestion.chunker import StructureAwareChunker
+
+
+def _pages(texts, source="a.pdf"):
+    return [Document(page_content=text, metadata={"source": source, "page": i + 1})
+            for i, text in enumerate(texts)]
+
+
+def test_chunks_never_exceed_the_token_budget():
+    chunker = StructureAwareChunker(chunk_tokens=100, overlap_tokens=20)
+    # No sentence boundaries: a lowercase run, a table and a reference list
+    lowercase = " ".join(f"word{i} and then some more lowercase text" for i in range(300))
+    table = "\n".join(f"row {i} | {i * 3.5} | {i * 7} | total {i * 11}" for i in range(300))
+    references = " ".join(f"[{i}] smith j. et al., proc. conf. {2000 + i % 20}, pp. {i}-{i + 9};"
+                          for i in range(200))
+    unbroken = "x" * 5000
+
+    # Before dedup: the synthetic rows differ only in digits, which MinHash ignores
+    chunks = chunker.chunk_documents(
+        _pages([lowercase, table, references, unbroken]))["a.pdf"]
+    assert len(chunks) > 20
+    for chunk in chunks:
+        assert count_tokens(chunk.page_content) <= 100
+        assert chunk.metadata["token_count"] <= 100
+    # Nothing is lost when text is cut between words
+    text = " ".join(chunk.page_content for chunk in chunks)
+    assert "word299" in text and "total 3289" in text and "[199]" in text
+
+
+def test_boilerplate_is_kept_once():
+    chunker = StructureAwareChunker(chunk_tokens=200)
+    topics = ["revenue growth", "hiring plans", "supply chain risks",
+              "marketing spend", "product roadmap"]
+    pages = _pages([
+        f"ACME Corp Quarterly Report\n\n{topic.upper()}\n"
+        f"This quarter the team reviewed {topic} in depth.\n"
+        f"Findings on {topic} are summarised below for the board.\n"
+        f"Further detail on {topic} follows in the appendix.\n\nPage {i + 1} of 5"
+        for i, topic in enumerate(topics)])
+
+    chunks = chunker.split_documents(pages)
+    boilerplate = [chunk for chunk in chunks if chunk.metadata.get("boilerplate")]
+    assert len(boilerplate) == 1
+    # The first original occurrence is kept, not the digit-normalised key
+    assert boilerplate[0].page_content.splitlines() == ["ACME Corp Quarterly Report",
+                                                        "Page 1 of 5"]
+    body = [chunk for chunk in chunks if not chunk.metadata.get("boilerplate")]
+    assert len(body) == 5
+    assert not any("ACME" in chunk.page_content or "of 5" in chunk.page_content
+                   for chunk in body)
+
+
+def test_near_duplicates_are_removed():
+    chunker = StructureAwareChunker(chunk_tokens=200)
+    disclaimer = ("This document is provided for information purposes only and does not "
+                  "constitute legal advice. Recipients should consult their own advisers "
+                  "before acting on any of the information it contains. Distribution of "
+                  "this material outside the organisation requires prior written consent.")
+    first = _pages([disclaimer], source="a.pdf")
+    # Same paragraph with one word changed, in another document
+    second = _pages([disclaimer.replace("prior written", "prior")], source="b.pdf")
+    distinct = _pages(["Self-attention relates positions of a single sequence to "
+                       "compute a representation of that sequence."], source="c.pdf")
+
+    chunks = chunker.split_documents(first + second + distinct)
+    assert [chunk.metadata["source"] for chunk in chunks] == ["a.pdf", "c.pdf"]
+    assert chunks[0].metadata["duplicates"] == [{"source": "b.pdf", "page": 1}]
@@ -0,0 +1,60 @@
+import os
+import time
+import numpy as np
+from src.document_ingestion.index_store import (
+    SessionIndexWriter, SessionIndex, current_build_files, STALE_BUILD_SECONDS)
+
+
+def _write(path, vectors, label):
+    SessionIndexWriter(dtype="float32").write(
+        path, [f"{label} {i}" for i in range(len(vectors))],
+        [{"source": f"{label}.pdf", "file_type": ".pdf", "page": i + 1}
+         for i in range(len(vectors))],
+        vectors, header_extra={"session_id": "s1"})
+
+
+def test_rebuild_while_an_older_index_is_open(tmp_path):
+    path = str(tmp_path / "s1")
+    rng = np.random.default_rng(0)
+    first, second = rng.normal(size=(40, 16)), rng.normal(size=(25, 16))
+    _write(path, first, "first")
+    opened = SessionIndex(path)
+    first_files = current_build_files(path)
+
+    _write(path, second, "second")
+    rebuilt = SessionIndex(path)
+    assert current_build_files(path).isdisjoint(first_files)
+    assert rebuilt.count == 25 and rebuilt.header["session_id"] == "s1"
+    assert rebuilt.search(second[11], 3)[0][0] == 11
+    assert rebuilt.fetch([11])[11] == ("second 11", {"source": "second.pdf",
+                                                     "file_type": ".pdf", "page": 12})
+    assert rebuilt.filter_rows(sources=["first.pdf"]) == []
+
+    # The index opened before the rebuild keeps reading its own build
+    assert opened.count == 40
+    assert opened.search(first[7], 3)[0][0] == 7
+    assert opened.fetch([7])[7][0] == "first 7"
+    np.testing.assert_allclose(
+        opened.get_vectors([7])[0], first[7] / np.linalg.norm(first[7]), rtol=1e-6)
+
+
+def test_stale_builds_are_removed(tmp_path):
+    path = str(tmp_path / "s1")
+    rng = np.random.default_rng(1)
+    _write(path, rng.normal(size=(5, 8)), "a")
+    oldest = current_build_files(path)
+    _write(path, rng.normal(size=(5, 8)), "b")
+    previous = current_build_files(path)
+    # Builds replaced within STALE_BUILD_SECONDS stay for open readers
+    assert all(os.path.exists(os.path.join(path, name)) for name in oldest)
+
+    aged = time.time() - STALE_BUILD_SECONDS - 60
+    for name in oldest | previous:
+        os.utime(os.path.join(path, name), (aged, aged))
+    _write(path, rng.normal(size=(5, 8)), "c")
+    remaining = set(os.listdir(path))
+    assert remaining.isdisjoint(oldest)
+    # The build just replaced is kept however old its files are
+    assert previous <= remaining
+    assert current_build_files(path) <= remaining
+    assert SessionIndex(path).fetch([0])[0][0] == "c 0"
@@ -0,0 +1,82 @@
+import os
+import pytest
+from src.job_queue.job_store import JobStore, QUEUED, RUNNING, FAILED
+from utils.path_utils import path_under, is_safe_id
+
+
+def _submit(store, name="a"):
+    job_id, _ = store.submit("index", "t1", {"name": name}, 0, name)
+    return job_id
+
+
+def test_recover_leaves_leased_jobs_alone(tmp_path):
+    db_path = str(tmp_path / "jobs.sqlite")
+    first, second = JobStore(db_path), JobStore(db_path)
+    live, dead = _submit(first, "live"), _submit(first, "dead")
+    first.claim_next("worker-a", lease_seconds=60)
+    second.claim_next("worker-b", lease_seconds=-1)  # owner stopped renewing
+
+    # A sibling process starting up only takes over the expired lease
+    assert JobStore(db_path).recover(max_attempts=3) == 1
+    assert first.get(live)["status"] == RUNNING
+    assert first.get(dead)["status"] == QUEUED
+
+    # The old owner can no longer record a result for the job it lost
+    first.complete(dead, {"ok": True}, owner="worker-b")
+    assert first.get(dead)["status"] == QUEUED
+    first.complete(live, {"ok": True}, owner="worker-a")
+    assert first.get(live)["result"] == {"ok": True}
+
+
+def test_retry_waits_for_backoff(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite"))
+    job_id = _submit(store)
+    store.claim_next("w", lease_seconds=60)
+    store.fail(job_id, "rate limited", "w", retry_after=3600)
+    assert store.get(job_id)["status"] == QUEUED
+    assert store.claim_next("w", lease_seconds=60) is None
+
+    store.fail(job_id, "ignored", "w", retry_after=None)  # not running: no effect
+    assert store.get(job_id)["status"] == QUEUED
+    store._conn.execute("UPDATE jobs SET not_before = NULL")
+    assert store.claim_next("w", lease_seconds=60)["attempts"] == 2
+    store.fail(job_id, "broken", "w")
+    assert store.get(job_id)["status"] == FAILED
+
+
+def test_ids_cannot_leave_their_root(tmp_path):
+    assert is_safe_id("session_20260101_120000_ab12cd34")
+    for bad in ("../../tmp/x", "a/b", "", "x" * 65, ".", None):
+        assert not is_safe_id(bad)
+    root = str(tmp_path)
+    assert path_under(root, "t1", "s1") == os.path.join(root, "t1", "s1")
+    for parts in (("..", "x"), ("t1", "../../x"), ("/etc",), ("",)):
+        with pytest.raises(ValueError):
+            path_under(root, *parts)
+
+
+def test_job_traces_under_the_submitting_request(tmp_path, monkeypatch):
+    import json
+    from logger import tracing
+    from src.job_queue.job_queue import JobQueue
+
+    monkeypatch.setitem(tracing.tracing_settings(), "export_dir", str(tmp_path / "traces"))
+    monkeypatch.setitem(tracing.tracing_settings(), "sample_rate", 1.0)
+    seen = {}
+
+    def handler(payload, report_progress):
+        seen["request_id"] = tracing.current_request_id()
+        return {}
+
+    queue = JobQueue(handlers={"echo": handler}, db_path=str(tmp_path / "jobs.sqlite"))
+    with tracing.start_trace("POST /echo", request_id="../../escape", profile=True) as trace:
+        request_id = trace.request_id
+        job_id = queue.submit("echo", {})["job_id"]
+    assert request_id != "../../escape"
+
+    queue._run(queue.store.claim_next(queue.owner, queue.lease_seconds))
+    assert seen["request_id"] == request_id
+    exported = [p for p in (tmp_path / "traces").rglob("*.json") if job_id in p.name]
+    assert [p.name for p in exported] == [f"{request_id}.{job_id}.1.json"]
+    trace = json.loads(exported[0].read_text())
+    assert trace["request_id"] == request_id and trace["attributes"]["job_id"] == job_id
@@ -0,0 +1,159 @@
+import os
+import json
+import threading
+import numpy as np
+import pytest
+from exception.custom_exception_archive import DocumentPortalException
+from src.document_ingestion.index_store import SessionIndexWriter, SessionIndex, HEADER_FILE
+from src.document_ingestion.session_snapshot import (
+    SessionSnapshotter, LocalObjectStore, HISTORY_FILE)
+
+
+def _build_session(index_dir, vectors, history=None):
+    session_path = os.path.join(index_dir, "t1", "s1")
+    SessionIndexWriter(dtype="float32").write(
+        session_path, [f"chunk {i}" for i in range(len(vectors))],
+        [{"source": "a.pdf", "file_type": ".pdf", "page": i + 1} for i in range(len(vectors))],
+        vectors, header_extra={"tenant_id": "t1", "session_id": "s1"})
+    if history is not None:
+        with open(os.path.join(session_path, HISTORY_FILE), "w") as f:
+            json.dump(history, f)
+    return session_path
+
+
+def _snapshotters(tmp_path):
+    store = LocalObjectStore(str(tmp_path / "store"))
+    source = SessionSnapshotter(index_dir=str(tmp_path / "worker_a"), store=store)
+    target = SessionSnapshotter(index_dir=str(tmp_path / "worker_b"), store=store)
+    return store, source, target
+
+
+def test_round_trip_through_store(tmp_path):
+    store, source, target = _snapshotters(tmp_path)
+    vectors = np.random.default_rng(0).normal(size=(50, 8))
+    _build_session(source.index_dir, vectors, history=[{"type": "human", "data": {}}])
+    key = source.export_to_store("t1", "s1", include_history=True)
+
+    assert target.ensure_local("t1", "s1") is True
+    assert target.ensure_local("t1", "s1") is False
+    original = SessionIndex(source.session_path("t1", "s1"))
+    imported = SessionIndex(target.session_path("t1", "s1"))
+    assert imported.header["snapshot_sha256"] in key
+    assert imported.search(vectors[7], 5) == original.search(vectors[7], 5)
+    assert imported.fetch([7]) == original.fetch([7])
+    with open(os.path.join(target.session_path("t1", "s1"), HISTORY_FILE)) as f:
+        assert json.load(f) == [{"type": "human", "data": {}}]
+
+
+def test_republish_is_imported_without_disturbing_open_indexes(tmp_path):
+    store, source, target = _snapshotters(tmp_path)
+    rng = np.random.default_rng(1)
+    first, second = rng.normal(size=(20, 8)), rng.normal(size=(30, 8))
+    _build_session(source.index_dir, first)
+    source.export_to_store("t1", "s1")
+    target.ensure_local("t1", "s1")
+    opened = SessionIndex(target.session_path("t1", "s1"))
+
+    _build_session(source.index_dir, second)
+    source.export_to_store("t1", "s1")
+    assert target.ensure_local("t1", "s1") is True
+
+    reopened = SessionIndex(target.session_path("t1", "s1"))
+    assert reopened.count == 30
+    assert reopened.search(second[3], 1)[0][0] == 3
+    # The index opened before the republish still reads its own snapshot
+    assert opened.count == 20
+    assert opened.search(first[4], 1)[0][0] == 4
+    assert opened.fetch([4])[4][0] == "chunk 4"
+
+
+def test_corrupt_snapshot_is_rejected(tmp_path):
+    store, source, target = _snapshotters(tmp_path)
+    _build_session(source.index_dir, np.random.default_rng(2).normal(size=(10, 8)))
+    key = source.export_to_store("t1", "s1")
+    manifest = source.read_manifest(store.path(key))
+    chunks = next(s for s in manifest["sections"] if s["name"] == "chunks.sqlite")
+
+    with open(store.path(key), "r+b") as f:
+        f.seek(chunks["offset"] + 10)
+        byte = f.read(1)
+        f.seek(chunks["offset"] + 10)
+        f.write(bytes([byte[0] ^ 0xFF]))
+    with pytest.raises(DocumentPortalException):
+        target.ensure_local("t1", "s1")
+    assert not os.path.exists(os.path.join(target.session_path("t1", "s1"), HEADER_FILE))
+
+    truncated = str(tmp_path / "truncated.dpsnap")
+    with open(store.path(key), "rb") as f, open(truncated, "wb") as out:
+        out.write(f.read()[:-20])
+    with pytest.raises(DocumentPortalException):
+        target.import_(truncated)
+
+
+def test_index_refuses_a_changed_snapshot(tmp_path):
+    store, source, target = _snapshotters(tmp_path)
+    _build_session(source.index_dir, np.random.default_rng(3).normal(size=(10, 8)))
+    source.export_to_store("t1", "s1")
+    target.ensure_local("t1", "s1")
+    header_path = os.path.join(target.session_path("t1", "s1"), HEADER_FILE)
+    with open(header_path) as f:
+        header = json.load(f)
+    header["snapshot_sha256"] = "0" * 64
+    with open(header_path, "w") as f:
+        json.dump(header, f)
+    with pytest.raises(DocumentPortalException):
+        SessionIndex(target.session_path("t1", "s1"))
+
+
+def test_concurrent_ensure_local(tmp_path):
+    store, source, target = _snapshotters(tmp_path)
+    vectors = np.random.default_rng(4).normal(size=(40, 8))
+    _build_session(source.index_dir, vectors)
+    source.export_to_store("t1", "s1")
+
+    errors = []
+
+    def worker():
+        try:
+            SessionSnapshotter(index_dir=target.index_dir, store=store).ensure_local("t1", "s1")
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert SessionIndex(target.session_path("t1", "s1")).search(vectors[9], 1)[0][0] == 9
+
+
+def test_reimport_keeps_newer_local_history(tmp_path):
+    store, source, target = _snapshotters(tmp_path)
+    rng = np.random.default_rng(5)
+    _build_session(source.index_dir, rng.normal(size=(10, 8)), history=[{"turn": 1}])
+    source.export_to_store("t1", "s1", include_history=True)
+    target.ensure_local("t1", "s1")
+    history_path = os.path.join(target.session_path("t1", "s1"), HISTORY_FILE)
+    with open(history_path) as f:
+        assert json.load(f) == [{"turn": 1}]
+
+    # This worker answers a turn; the source then rebuilds and republishes
+    with open(history_path, "w") as f:
+        json.dump([{"turn": 1}, {"turn": 2}], f)
+    _build_session(source.index_dir, rng.normal(size=(12, 8)))
+    manifest_key = source.export_to_store("t1", "s1")
+    assert HISTORY_FILE not in [s["name"] for s in
+                                source.read_manifest(store.path(manifest_key))["sections"]]
+    assert target.ensure_local("t1", "s1") is True
+    with open(history_path) as f:
+        assert json.load(f) == [{"turn": 1}, {"turn": 2}]
+
+    # An explicit snapshot with older history does not roll it back either
+    past = os.path.getmtime(history_path) - 60
+    os.utime(os.path.join(source.session_path("t1", "s1"), HISTORY_FILE), (past, past))
+    source.export_to_store("t1", "s1", include_history=True)
+    assert target.ensure_local("t1", "s1") is True
+    with open(history_path) as f:
+        assert json.load(f) == [{"turn": 1}, {"turn": 2}]
+    assert SessionIndex(target.session_path("t1", "s1")).count == 12
@@ -0,0 +1,133 @@
+import re
+from collections import Counter
+from functools import lru_cache
+import tiktoken
+
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9\"'(])")
+_WORD = re.compile(r"[A-Za-z][A-Za-z\-]{3,}")
+_WORD_WITH_SPACE = re.compile(r"\S+\s*")
+
+
+@lru_cache(maxsize=1)
+def _get_encoding():
+    """
+    cl100k is close enough to the Groq/Gemini tokenizers for budgeting.
+    tiktoken downloads it on first use, so fall back to an estimate offline.
+    """
+    try:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return None
+
+
+def tokenizer_name() -> str:
+    """
+    Name of the tokenizer count_tokens uses, for keying token-based artifacts.
+    """
+    encoding = _get_encoding()
+    return encoding.name if encoding is not None else "chars/4"
+
+
+def count_tokens(text: str) -> int:
+    """
+    Count the tokens a piece of text will roughly cost in a prompt.
+    """
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is None:
+        return max(1, len(text) // 4)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def split_sentences(text: str) -> list[str]:
+    """
+    Split text into sentences, dropping empty fragments.
+    """
+    text = re.sub(r"\s+", " ", text)
+    return [s.strip() for s in _SENTENCE_SPLIT.split(text) if s.strip()]
+
+
+def split_to_token_limit(text: str, max_tokens: int) -> list[str]:
+    """
+    Split text into pieces of at most `max_tokens` tokens, for text with no
+    sentence boundaries to split on (tables, reference lists). Cuts between
+    words, keeping the whitespace inside each piece; a single word longer
+    than the limit is cut by characters.
+    """
+    pieces, current, estimate = [], [], 0
+    for word in _WORD_WITH_SPACE.findall(text.strip()):
+        cost = count_tokens(word)
+        if cost > max_tokens:
+            if current:
+                pieces.append(current)
+                current, estimate = [], 0
+            pieces.extend([part] for part in _cut_word(word.strip(), max_tokens))
+            continue
+        if current and estimate + cost > max_tokens:
+            pieces.append(current)
+            current, estimate = [], 0
+        current.append(word)
+        estimate += cost
+    if current:
+        pieces.append(current)
+
+    # Per-word counts only estimate the joined text; move words on until it fits
+    result = []
+    for i, words in enumerate(pieces):
+        while len(words) > 1 and count_tokens("".join(words).strip()) > max_tokens:
+            if i + 1 == len(pieces):
+                pieces.append([])
+            pieces[i + 1].insert(0, words.pop())
+        if words:
+            result.append("".join(words).strip())
+    return result
+
+
+def _cut_word(word: str, max_tokens: int) -> list[str]:
+    parts = []
+    while word:
+        end = len(word)
+        tokens = count_tokens(word)
+        while tokens > max_tokens:
+            end = max(1, min(end - 1, end * max_tokens // tokens))
+            tokens = count_tokens(word[:end])
+        parts.append(word[:end])
+        word = word[end:]
+    return parts
+
+
+def select_key_sentences(text: str, token_budget: int) -> str:
+    """
+    Extractively pick the most representative sentences of a text that fit
+    into `token_budget` tokens. Sentences are scored by the frequency of
+    their content words, with a small bonus for appearing early, and are
+    returned in their original order.
+    """
+    sentences = split_sentences(text)
+    if count_tokens(text) <= token_budget:
+        return " ".join(sentences)
+
+    frequencies = Counter(w.lower() for w in _WORD.findall(text))
+    if not frequencies:
+        return ""
+    top = frequencies.most_common(1)[0][1]
+
+    scored = []
+    for position, sentence in enumerate(sentences):
+        words = [w.lower() for w in _WORD.findall(sentence)]
+        if len(words) < 4:
+            continue
+        score = sum(frequencies[w] / top for w in words) / len(words) ** 0.5
+        score *= 1.0 + 0.5 / (1 + position / 10)
+        scored.append((score, position, sentence))
+
+    selected, used = [], 0
+    for score, position, sentence in sorted(scored, reverse=True):
+        cost = count_tokens(sentence) + 1
+        if used + cost > token_budget:
+            continue
+        selected.append((position, sentence))
+        used += cost
+
+    return " ".join(sentence for _, sentence in sorted(selected))
@@ -51,14 +51,15 @@ class ModelLoader:
             log.error("Error loading embedding model", error=str(e))
             raise
 
-    def load_llm(self):
+    def load_llm(self, provider_key: str = None):
         """
         Load and return llm model.
+        `provider_key` selects a block under `llm` in config; defaults to LLM_PROVIDER.
         """
         """Load LLM dynamically based on provider in config."""
         llm_block = self.config["llm"]
         # Default provider ya ENV var se choose karo
-        provider_key = os.getenv("LLM_PROVIDER", "groq")  # Default groq
+        provider_key = provider_key or os.getenv("LLM_PROVIDER", "groq")  # Default groq
 
         if provider_key not in llm_block:
             log.error("LLM provider not found in config",
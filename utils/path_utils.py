@@ -0,0 +1,26 @@
+import os
+import re
+
+# Tenant and session ids become directory names, so only plain names pass
+SAFE_ID = re.compile(r"[A-Za-z0-9_-]{1,64}")
+
+
+def is_safe_id(value) -> bool:
+    """
+    Whether `value` can be used as a single path component.
+    """
+    return isinstance(value, str) and SAFE_ID.fullmatch(value) is not None
+
+
+def path_under(root: str, *parts: str) -> str:
+    """
+    Join `parts` onto `root`, refusing any result outside `root` (through
+    "..", absolute parts or an empty name).
+    """
+    path = os.path.join(root, *parts)
+    resolved_root = os.path.realpath(root)
+    resolved = os.path.realpath(path)
+    if resolved == resolved_root or \
+            os.path.commonpath([resolved_root, resolved]) != resolved_root:
+        raise ValueError(f"Path escapes {root}: {os.path.join(*parts) if parts else ''}")
+    return path
@@ -16,7 +16,10 @@ packages = [
     "fastapi",
     "uvicorn",
     "python-multipart",
-    "docx2txt"
+    "docx2txt",
+    "python-docx",
+    "langdetect",
+    "tiktoken"
 ]
 for pkg in packages:
     try: